@@ -0,0 +1,160 @@
+# ann_index.py
+# IVF-Flat 근사 최근접 이웃(ANN) 색인 - 순수 NumPy 구현
+#
+# build_index.py가 색인 후 hibot_store.db 옆에 hibot_store.ivf.npz 로 저장하고,
+# chatbot.py의 DuckDBEmbeddingRetriever가 index_type="ivf"일 때 읽어서 사용한다.
+# 검색 시 질문과 가까운 클러스터(nprobe개)만 전수 비교하므로
+# nprobe를 키우면 정확도(recall)↑ / 속도↓, 줄이면 그 반대다.
+import os
+import time
+
+import numpy as np
+
+
+IVF_INDEX_SUFFIX = ".ivf.npz"
+
+
+def ivf_index_path(db_path):
+    """hibot_store.db → hibot_store.ivf.npz"""
+    base, _ = os.path.splitext(db_path)
+    return base + IVF_INDEX_SUFFIX
+
+
+def default_nlist(n_rows):
+    """문서 수에 맞춘 기본 클러스터 수 (≈ 4·√N)"""
+    if n_rows <= 0:
+        return 1
+    return int(max(1, min(n_rows, round(4 * np.sqrt(n_rows)))))
+
+
+def top_k_indices(scores, k):
+    """scores에서 점수가 높은 k개의 위치를 내림차순으로 반환"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx])]
+
+
+class IVFFlatIndex:
+    """정규화된 임베딩 행렬 위에서 동작하는 IVF-Flat 색인
+
+    - centroids   : (nlist, dim) 정규화된 클러스터 중심
+    - list_offsets: (nlist + 1,) 클러스터별 행 범위 (CSR 형식)
+    - list_rows   : (N,) 클러스터 순서로 정렬된 행 번호
+    - ids         : (N,) 색인 당시의 문서 id (행 순서 검증용)
+    벡터 자체는 저장하지 않고, 검색 시 리트리버의 행렬을 그대로 사용한다.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, ids):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_rows = np.asarray(list_rows, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=object)
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    # ------------------------------
+    # 색인 생성 (spherical k-means)
+    # ------------------------------
+    @classmethod
+    def build(cls, matrix, ids, nlist=None, n_iter=20, seed=0, max_train_per_list=256):
+        """정규화된 float32 행렬(N, dim)로 IVF 색인을 만든다"""
+        n_rows = matrix.shape[0]
+        nlist = default_nlist(n_rows) if nlist is None else int(max(1, min(nlist, n_rows)))
+        rng = np.random.default_rng(seed)
+
+        # 학습은 표본으로만 (클러스터당 최대 max_train_per_list개)
+        n_train = min(n_rows, nlist * max_train_per_list)
+        train = matrix[rng.choice(n_rows, size=n_train, replace=False)] if n_train < n_rows else matrix
+
+        centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = cls._assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            counts = np.bincount(assign, minlength=nlist)
+
+            # 빈 클러스터는 임의의 학습 벡터로 다시 시작
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        assign = cls._assign(matrix, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        return cls(centroids, list_offsets, order, ids)
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk_size=65536):
+        """각 벡터를 가장 가까운(내적 최대) 클러스터에 배정"""
+        assign = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk_size):
+            block = vectors[start:start + chunk_size]
+            assign[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+        return assign
+
+    # ------------------------------
+    # 검색
+    # ------------------------------
+    def search(self, matrix, query, k, nprobe=8):
+        """정규화된 query와 가까운 k개 행 번호와 점수를 반환"""
+        nprobe = int(max(1, min(nprobe, self.nlist)))
+        probe = top_k_indices(self.centroids @ query, nprobe)
+
+        candidates = np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+        if candidates.shape[0] == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = matrix[candidates] @ query
+        best = top_k_indices(scores, k)
+        return candidates[best], scores[best]
+
+    # ------------------------------
+    # 저장 / 로드
+    # ------------------------------
+    def save(self, path):
+        """임시 파일에 쓴 뒤 교체 → 읽는 쪽이 반쯤 쓰인 파일을 보지 않도록"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_rows=self.list_rows,
+                ids=self.ids.astype(str),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["centroids"],
+                data["list_offsets"],
+                data["list_rows"],
+                data["ids"].astype(object),
+            )
+
+
+def build_and_save(matrix, ids, path, nlist=None):
+    """색인 스크립트용: IVF 색인을 만들고 저장한 뒤 요약을 출력"""
+    start = time.perf_counter()
+    index = IVFFlatIndex.build(matrix, ids, nlist=nlist)
+    index.save(path)
+    elapsed = time.perf_counter() - start
+    print(f"🧭 IVF 색인 저장: {path} (문서 {len(ids)}개, nlist={index.nlist}, {elapsed:.1f}s)")
+    return index
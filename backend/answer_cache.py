@@ -0,0 +1,149 @@
+# answer_cache.py
+# 반복 질문용 답변 캐시 (RAG + Gemini 호출 앞단)
+#
+# 1) 정규화한 질문 문자열이 같으면 바로 hit
+# 2) 아니면 캐시된 질문 임베딩 중 코사인 유사도가 threshold 이상인 것이 있으면 hit
+# 항목은 TTL이 지나거나 max_entries를 넘으면(LRU) 제거되고,
+# 문서 DB가 바뀌면(build_index.py 재실행) 전부 비운다.
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+_TRAILING_MARKS = re.compile(r"[\s?？!！.。~]+$")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """공백/대소문자/끝 문장부호 차이를 없앤 캐시 키"""
+    text = _SPACES.sub(" ", (text or "").strip()).lower()
+    return _TRAILING_MARKS.sub("", text)
+
+
+class SemanticAnswerCache:
+    """질문 → 답변 캐시 (스레드 안전)
+
+    값은 호출하는 쪽에서 정하는 임의의 객체 (예: {"answer": ..., "source": ...})
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600, threshold=0.93):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        # key → (value, 정규화된 임베딩, 저장 시각), 오래 안 쓴 순서
+        self._entries = OrderedDict()
+        self._corpus_version = None
+        self._lock = threading.Lock()
+
+        # 유사도 검색용 행렬 (항목이 바뀌면 다시 만든다)
+        self._keys = []
+        self._matrix = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # ------------------------------
+    # 조회
+    # ------------------------------
+    def get_exact(self, question):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._get_live(key)
+            if entry is None:
+                return None
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_similar(self, embedding):
+        """가장 가까운 캐시 질문이 threshold 이상이면 그 값을, 아니면 None (miss로 집계)"""
+        query = _unit(embedding)
+        with self._lock:
+            if query is not None and self._entries:
+                if self._matrix is None:
+                    self._rebuild_matrix()
+                if self._matrix.shape[0]:
+                    scores = self._matrix @ query
+                    best = int(np.argmax(scores))
+                    entry = self._get_live(self._keys[best]) if scores[best] >= self.threshold else None
+                    if entry is not None:
+                        self.semantic_hits += 1
+                        return entry[0]
+            self.misses += 1
+            return None
+
+    def _get_live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] > self.ttl_seconds:
+            del self._entries[key]
+            self._matrix = None
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    # ------------------------------
+    # 저장 / 무효화
+    # ------------------------------
+    def put(self, question, embedding, value):
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = (value, _unit(embedding), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def check_corpus(self, corpus_version):
+        """문서 DB(+ FAQ) 버전이 바뀌었으면 캐시를 비운다"""
+        with self._lock:
+            if corpus_version == self._corpus_version:
+                return
+            if self._entries:
+                print(f"🧹 문서 DB / FAQ가 바뀌어 답변 캐시 {len(self._entries)}개를 비웁니다.")
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._corpus_version = corpus_version
+
+    def _rebuild_matrix(self):
+        """만료 항목을 정리하고 임베딩이 있는 항목으로 (N, dim) 행렬을 만든다"""
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e[2] > self.ttl_seconds]:
+            del self._entries[key]
+
+        self._keys = [k for k, e in self._entries.items() if e[1] is not None]
+        if self._keys:
+            self._matrix = np.stack([self._entries[k][1] for k in self._keys])
+        else:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    # ------------------------------
+    # 통계
+    # ------------------------------
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+def _unit(embedding):
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else None
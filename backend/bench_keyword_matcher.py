@@ -0,0 +1,100 @@
+# bench_keyword_matcher.py
+# FAQ 키워드 / 동의어 검사: 기존 이중 루프 vs Aho–Corasick 매처 속도 비교
+#
+# 사용 예:
+#   python bench_keyword_matcher.py                      # 실제 synonym_map.json + 가짜 용어 100/1000/5000개
+#   python bench_keyword_matcher.py --terms 10000 --queries 5000
+#
+# 실제 동의어 맵에 임의의 한국어 용어를 덧붙여 용어 수가 늘어날 때의 비용을 본다.
+import argparse
+import json
+import random
+import time
+
+from faq_registry import load_faq_entries
+from keyword_matcher import build_keyword_matcher
+
+SYNONYM_MAP_PATH = "synonym_map.json"
+FAQ_PATH = "faq.json"
+
+# chatbot.py와 같은 FAQ 키워드 (faq.json)
+FAQ_KEYWORDS = [entry.keywords for entry in load_faq_entries(FAQ_PATH)]
+
+
+def legacy_match(question, synonym_map):
+    """예전 chatbot.py 방식: FAQ 키워드 루프 → 동의어 루프"""
+    for idx, keywords in enumerate(FAQ_KEYWORDS):
+        for kw in keywords:
+            if kw in question:
+                return ("faq", idx)
+    for rep_keyword, synonyms in synonym_map.items():
+        if rep_keyword in question:
+            return ("synonym", rep_keyword)
+        for syn in synonyms:
+            if syn in question:
+                return ("synonym", rep_keyword)
+    return None
+
+
+def random_word(rng, min_len=2, max_len=5):
+    """임의의 한글 음절(가~힣)로 만든 단어"""
+    return "".join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_synonym_map(base, n_terms, rng):
+    """실제 동의어 맵 + 대표 키워드 n_terms개(각각 동의어 3개)"""
+    synonym_map = dict(base)
+    while len(synonym_map) < len(base) + n_terms:
+        synonym_map[random_word(rng)] = [random_word(rng) for _ in range(3)]
+    return synonym_map
+
+
+def make_queries(synonym_map, n_queries, rng):
+    """절반은 아는 용어를 섞은 질문, 절반은 용어가 없을 법한 질문"""
+    terms = [t for rep, syns in synonym_map.items() for t in [rep, *syns]]
+    terms += [kw for keywords in FAQ_KEYWORDS for kw in keywords]
+    queries = []
+    for i in range(n_queries):
+        words = [random_word(rng) for _ in range(rng.randint(3, 8))]
+        if i % 2 == 0:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(terms))
+        queries.append(" ".join(words) + " 어떻게 하나요?")
+    return queries
+
+
+def bench(fn, queries):
+    start = time.perf_counter()
+    found = sum(1 for q in queries if fn(q) is not None)
+    return (time.perf_counter() - start) * 1e6 / len(queries), found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--terms", type=int, nargs="+", default=[0, 100, 1000, 5000], help="덧붙일 대표 키워드 수")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(SYNONYM_MAP_PATH, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    print(f"{'용어 수':>8} | {'기존 루프':>12} | {'Aho–Corasick':>12} | {'빌드':>8} | 매칭 질문 수(기존/AC)")
+    for n_terms in args.terms:
+        rng = random.Random(args.seed)
+        synonym_map = make_synonym_map(base, n_terms, rng)
+        queries = make_queries(synonym_map, args.queries, rng)
+
+        start = time.perf_counter()
+        matcher = build_keyword_matcher(FAQ_KEYWORDS, synonym_map)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        legacy_us, legacy_found = bench(lambda q: legacy_match(q, synonym_map), queries)
+        ac_us, ac_found = bench(matcher.best, queries)
+        print(
+            f"{len(matcher):>8} | {legacy_us:9.1f} µs | {ac_us:9.1f} µs | {build_ms:5.0f} ms | "
+            f"{legacy_found}/{ac_found}"
+        )
+
+
+if __name__ == "__main__":
+    main()
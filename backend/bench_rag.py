@@ -0,0 +1,484 @@
+# bench_rag.py
+# 오프라인 성능 / 검색 품질 벤치마크 (모델 다운로드, Gemini 호출 없이 실행)
+#
+# 사용 예:
+#   python bench_rag.py                                   # 파일 40개 × 20쪽 합성 말뭉치
+#   python bench_rag.py --files 200 --pages 30 --concurrency 1 4 16
+#   python bench_rag.py --split-length 400 --split-overlap 80 --mode vector hybrid --index exact ivf
+#   python bench_rag.py --json before.json                # 결과를 저장해 변경 전후 비교
+#
+# 1) 색인  : 합성 한국어 규정 문서를 임시 DuckDB에 build_index.py와 같은 경로
+#            (iter_page_chunks → EmbeddingQueue → DuckDBDocumentStore)로 색인 → pages/s, chunks/s
+# 2) 품질  : 페이지의 한 문장에서 고유 용어 2개를 뽑아 질문을 만들고,
+#            그 용어가 모두 들어 있는 청크를 정답으로 recall@k / MRR 계산
+# 3) 검색  : DuckDBEmbeddingRetriever.run 지연시간 p50/p95/p99 + 스레드 동시 실행 QPS
+# 4) 전체  : /api/chat (FAQ → 임베딩 → 검색 → 프롬프트 → 로컬 Gemini 스텁) 지연시간 / QPS
+# 5) 메모리: 최대 RSS, 임베딩 행렬 / BM25 색인 크기
+#
+# 임베딩은 ko-sbert 대신 글자 바이그램 해싱 임베더를 쓴다 → 절대 수치보다 변경 전후 비교용.
+# (--model 을 주면 로컬에 있는 SentenceTransformers 모델로 임베딩)
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from lexical_index import tokenize
+from vector_store import EMBEDDING_DIM, export_embedding_snapshot, load_embedding_matrix
+
+# 합성 문서에 섞는 규정 용어 (주제 문장의 뼈대, 고유 용어는 임의 음절로 만든다)
+TOPIC_TERMS = [
+    "출장비", "여비", "숙박비", "일비", "식비", "복무", "휴가", "연가", "병가", "공가",
+    "특별휴가", "초과근무", "당직", "재택근무", "유연근무", "보수", "수당", "상여금", "성과급", "퇴직금",
+    "교육훈련", "승진", "평가", "징계", "포상", "계약", "구매", "입찰", "검수", "회계",
+    "예산", "결산", "감사", "보안", "정보공개", "개인정보", "문서관리", "전자결재", "인사발령", "채용",
+]
+TEMPLATES = [
+    "{topic}은 {term} 기준에 따라 {days}일 이내에 {term2} 절차로 처리한다.",
+    "{term} 신청은 {topic} 담당 부서에 {term2} 서류를 제출해야 한다.",
+    "{topic} 지급액은 {term}별로 {amount}만원을 넘을 수 없으며 {term2} 승인이 필요하다.",
+    "{term} 해당자는 {topic} 규정 제{days}조에 따라 {term2} 내역을 보고한다.",
+    "{topic} 관련 {term} 변경 시에는 {days}일 전까지 {term2}에 통보한다.",
+]
+QUESTION_TEMPLATES = [
+    "{a} {b} 관련 규정 알려줘",
+    "{a}랑 {b}는 어떻게 처리해?",
+    "{a} {b} 기준이 뭐야?",
+]
+
+
+# ------------------------------
+# 임베더 (오프라인)
+# ------------------------------
+class HashingEmbedder:
+    """글자 바이그램을 768차원에 해싱하는 결정적 임베더
+
+    SentenceTransformersTextEmbedder(run(text=...))와
+    SentenceTransformersDocumentEmbedder(run(documents))를 둘 다 흉내 낸다.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def warm_up(self):
+        pass
+
+    def embed(self, text):
+        tokens = tokenize(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not tokens:
+            return vector
+        hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint32, count=len(tokens))
+        signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+        np.add.at(vector, (hashes >> 1) % self.dim, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def run(self, documents=None, text=None):
+        if text is not None:
+            return {"embedding": self.embed(text).tolist()}
+        for doc in documents:
+            doc.embedding = self.embed(doc.content).tolist()
+        return {"documents": documents}
+
+
+def create_embedders(model):
+    """(문서 임베더, 질문 임베더) - model이 없으면 해싱 임베더"""
+    if not model:
+        embedder = HashingEmbedder()
+        return embedder, embedder
+
+    from haystack.components.embedders import (
+        SentenceTransformersDocumentEmbedder,
+        SentenceTransformersTextEmbedder,
+    )
+    doc_embedder = SentenceTransformersDocumentEmbedder(model=model, progress_bar=False, local_files_only=True)
+    text_embedder = SentenceTransformersTextEmbedder(model=model, progress_bar=False, local_files_only=True)
+    doc_embedder.warm_up()
+    text_embedder.warm_up()
+    return doc_embedder, text_embedder
+
+
+# ------------------------------
+# 합성 말뭉치 + 질문 세트
+# ------------------------------
+def random_word(rng, min_len=2, max_len=4):
+    """임의의 한글 음절(가~힣)로 만든 고유 용어"""
+    return "".join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_sentence(rng, topic):
+    """(문장, 고유 용어 2개)"""
+    term, term2 = random_word(rng), random_word(rng)
+    sentence = rng.choice(TEMPLATES).format(
+        topic=topic, term=term, term2=term2, days=rng.randint(3, 90), amount=rng.randint(1, 500)
+    )
+    return sentence, (term, term2)
+
+
+def make_corpus(n_files, n_pages, words_per_page, seed):
+    """{file_name: [페이지 텍스트...]}, 질문 후보 [(고유 용어 2개, file_name)]"""
+    rng = random.Random(seed)
+    corpus, facts = {}, []
+    for f in range(n_files):
+        topic = TOPIC_TERMS[f % len(TOPIC_TERMS)]
+        file_name = f"합성규정_{f:04d}_{topic}.pdf"
+        pages = []
+        for _ in range(n_pages):
+            sentences, words = [], 0
+            while words < words_per_page:
+                sentence, terms = make_sentence(rng, topic)
+                sentences.append(sentence)
+                facts.append((terms, file_name))
+                words += len(sentence.split())
+            pages.append(" ".join(sentences))
+        corpus[file_name] = pages
+    return corpus, facts
+
+
+def make_questions(facts, n_questions, seed):
+    rng = random.Random(seed + 1)
+    picked = rng.sample(facts, min(n_questions, len(facts)))
+    return [(rng.choice(QUESTION_TEMPLATES).format(a=a, b=b), (a, b)) for (a, b), _ in picked]
+
+
+def label_questions(conn, questions):
+    """질문의 고유 용어가 모두 들어 있는 청크 id = 정답"""
+    ids, contents = zip(*conn.execute("SELECT id, content FROM documents ORDER BY id").fetchall())
+    labelled = []
+    for question, terms in questions:
+        relevant = {doc_id for doc_id, content in zip(ids, contents) if all(t in content for t in terms)}
+        if relevant:
+            labelled.append((question, relevant))
+    return labelled
+
+
+# ------------------------------
+# 측정 도우미
+# ------------------------------
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+    }
+
+
+def format_latency(summary):
+    return f"p50 {summary['p50_ms']:7.2f}ms | p95 {summary['p95_ms']:7.2f}ms | p99 {summary['p99_ms']:7.2f}ms"
+
+
+# ------------------------------
+# 1) 색인
+# ------------------------------
+def bench_indexing(db_path, corpus, doc_embedder, split_length, split_overlap, batch_size):
+    import build_index
+
+    store = build_index.DuckDBDocumentStore(db_path, normalize=True)
+    timer = build_index.StageTimer()
+    queue = build_index.EmbeddingQueue(store, doc_embedder, timer, batch_size=batch_size)
+    store.verbose = False
+
+    n_pages = sum(len(pages) for pages in corpus.values())
+    start = time.perf_counter()
+    for file_name, texts in corpus.items():
+        pages = [(page_number, text, "text") for page_number, text in enumerate(texts)]
+        page_hashes = [build_index.content_hash(text) for text in texts]
+        queue.add_file(file_name)
+        chunks = build_index.iter_page_chunks(
+            build_index.record_pages(pages, file_name, page_hashes, queue.page_rows),
+            file_name, split_length=split_length, split_overlap=split_overlap,
+        )
+        for doc in timer.timed(chunks, "분할"):
+            queue.add(doc)
+        queue.close_file(file_name, build_index.content_hash("".join(texts)), len(texts))
+    queue.flush(final=True)
+    store.conn.execute("CHECKPOINT")
+    elapsed = time.perf_counter() - start
+
+    n_chunks = store.count_documents()
+    export_embedding_snapshot(store.conn, db_path)
+    result = {
+        "files": len(corpus),
+        "pages": n_pages,
+        "chunks": n_chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(n_pages / elapsed, 1),
+        "chunks_per_sec": round(n_chunks / elapsed, 1),
+        "stages": {stage: round(seconds, 3) for stage, seconds in timer.seconds.items()},
+        "db_mb": round(os.path.getsize(db_path) / 1024 / 1024, 2),
+    }
+    return store, result
+
+
+# ------------------------------
+# 2)~3) 검색 품질 / 지연시간 / 동시 실행
+# ------------------------------
+def score_rankings(rankings, labelled, k):
+    recalls, reciprocal_ranks = [], []
+    for ranked_ids, (_, relevant) in zip(rankings, labelled):
+        found = [i for i, doc_id in enumerate(ranked_ids[:k]) if doc_id in relevant]
+        recalls.append(len(found) / min(len(relevant), k))
+        reciprocal_ranks.append(1.0 / (found[0] + 1) if found else 0.0)
+    return round(float(np.mean(recalls)), 4), round(float(np.mean(reciprocal_ranks)), 4)
+
+
+def bench_retriever(retriever, labelled, query_embeddings, k, concurrency_levels, reranker=None):
+    # 첫 호출에 행렬 / BM25 적재 (측정에서 제외)
+    load_start = time.perf_counter()
+    retriever.refresh()
+    load_seconds = time.perf_counter() - load_start
+
+    def search(i):
+        start = time.perf_counter()
+        fetch_k = reranker.candidates if reranker is not None else None
+        docs = retriever.run(query_embedding=[query_embeddings[i]], query=labelled[i][0], top_k=fetch_k)["documents"]
+        if reranker is not None:
+            docs = reranker.run(labelled[i][0], docs)["documents"]
+        return time.perf_counter() - start, [doc.id for doc in docs]
+
+    latencies, rankings = zip(*(search(i) for i in range(len(labelled))))
+    recall, mrr = score_rankings(rankings, labelled, k)
+
+    qps = {}
+    for n in concurrency_levels:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            list(pool.map(search, range(len(labelled))))
+        qps[n] = round(len(labelled) / (time.perf_counter() - start), 1)
+
+    snapshot = retriever.snapshot
+    lexical_mb = 0.0
+    if snapshot.lexical_index is not None:
+        lex = snapshot.lexical_index
+        lexical_mb = (lex.rows.nbytes + lex.weights.nbytes + lex.offsets.nbytes) / 1024 / 1024
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "latency": latency_summary(latencies),
+        f"recall@{k}": recall,
+        "mrr": mrr,
+        "qps": qps,
+        "matrix_mb": round(snapshot.matrix.nbytes / 1024 / 1024, 2),
+        "lexical_index_mb": round(lexical_mb, 2),
+    }
+
+
+# ------------------------------
+# 4) /api/chat 전체 경로 (로컬 Gemini 스텁)
+# ------------------------------
+def start_gemini_stub(latency_ms):
+    """generateContent를 흉내 내는 로컬 HTTP 서버 → (서버, 주소)"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            time.sleep(latency_ms / 1000)
+            body = json.dumps({
+                "candidates": [{
+                    "content": {"parts": [{"text": "스텁 답변입니다."}], "role": "model"},
+                    "finishReason": "STOP",
+                }]
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_end_to_end(chatbot, questions, concurrency_levels):
+    import httpx
+
+    async def run(n):
+        latencies, busy = [], 0
+        slots = asyncio.Semaphore(n)
+        transport = httpx.ASGITransport(app=chatbot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            async def ask(question):
+                nonlocal busy
+                async with slots:
+                    start = time.perf_counter()
+                    response = await client.post("/api/chat", json={"message": question})
+                    # 혼잡 응답은 바로 돌아오므로 지연시간/처리량에서 뺀다
+                    if response.json()["response"] == chatbot.BUSY_MESSAGE:
+                        busy += 1
+                    else:
+                        latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(ask(q) for q in questions))
+            elapsed = time.perf_counter() - start
+        return {"latency": latency_summary(latencies), "qps": round(len(latencies) / elapsed, 1), "busy": busy}
+
+    return {n: asyncio.run(run(n)) for n in concurrency_levels}
+
+
+# ------------------------------
+# 메인
+# ------------------------------
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=40, help="합성 PDF 파일 수")
+    parser.add_argument("--pages", type=int, default=20, help="파일당 페이지 수")
+    parser.add_argument("--words-per-page", type=int, default=250)
+    parser.add_argument("--split-length", type=int, default=700, help="청크 단어 수 (build_index.py SPLIT_LENGTH)")
+    parser.add_argument("--split-overlap", type=int, default=150, help="청크 겹침 단어 수 (SPLIT_OVERLAP)")
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--k", type=int, default=6, help="top_k (chatbot.py와 같은 6)")
+    parser.add_argument("--mode", nargs="+", default=["vector", "hybrid"], choices=["vector", "hybrid"])
+    parser.add_argument("--index", nargs="+", default=["exact"], choices=["exact", "ivf"])
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--rerank-model", default=None, help="재순위 비교용 로컬 크로스 인코더 모델")
+    parser.add_argument("--rerank-candidates", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Gemini 스텁 응답 지연")
+    parser.add_argument("--skip-e2e", action="store_true", help="/api/chat 전체 경로 측정 생략")
+    parser.add_argument("--model", default=None, help="해싱 임베더 대신 쓸 로컬 SentenceTransformers 모델")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="결과를 저장할 JSON 파일")
+    parser.add_argument("--keep", action="store_true", help="임시 DB 디렉터리를 지우지 않음")
+    parser.add_argument("--verbose", action="store_true", help="/api/chat 요청 로그 출력")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="hibot_bench_")
+    db_path = os.path.join(work_dir, "bench_store.db")
+    results = {"args": vars(args)}
+    stub = None
+    try:
+        doc_embedder, text_embedder = create_embedders(args.model)
+
+        # 1) 색인
+        corpus, facts = make_corpus(args.files, args.pages, args.words_per_page, args.seed)
+        print(f"📚 합성 말뭉치: 파일 {args.files}개 × {args.pages}쪽 (쪽당 약 {args.words_per_page}단어) → {work_dir}")
+        store, results["indexing"] = bench_indexing(
+            db_path, corpus, doc_embedder, args.split_length, args.split_overlap, args.embed_batch_size
+        )
+        indexing = results["indexing"]
+        print(
+            f"🏗️ 색인: 청크 {indexing['chunks']}개, {indexing['seconds']:.2f}s "
+            f"({indexing['pages_per_sec']:,.0f} pages/s, {indexing['chunks_per_sec']:,.0f} chunks/s), DB {indexing['db_mb']}MB"
+        )
+
+        labelled = label_questions(store.conn, make_questions(facts, args.questions, args.seed))
+        store.conn.close()
+        print(f"❓ 정답이 있는 질문 {len(labelled)}개")
+
+        embed_start = time.perf_counter()
+        query_embeddings = [text_embedder.run(text=q)["embedding"] for q, _ in labelled]
+        results["query_embed_ms"] = round((time.perf_counter() - embed_start) * 1000 / len(labelled), 3)
+
+        # 2)~3) 검색 설정별 비교
+        import chatbot
+        from ann_index import build_and_save, ivf_index_path
+
+        if "ivf" in args.index:
+            import duckdb
+            conn = duckdb.connect(db_path, read_only=True)
+            ids, _, matrix = load_embedding_matrix(conn, with_meta=False)
+            conn.close()
+            build_and_save(matrix, ids, ivf_index_path(db_path))
+
+        rerankers = [None]
+        if args.rerank_model:
+            from reranker import CrossEncoderReranker
+            # 품질 비교용이라 점수 기준(threshold)과 timeout 없이 순위만 바꾼다
+            reranker = CrossEncoderReranker(
+                args.rerank_model, top_k=args.k, candidates=args.rerank_candidates, threshold=None, timeout=None
+            )
+            reranker.warm_up()
+            rerankers.append(reranker)
+
+        results["retrieval"] = {}
+        print(f"\n{'설정':<14} | {'지연시간':^48} | recall@{args.k} |   MRR  | QPS (스레드 수별)")
+        for mode in args.mode:
+            for index_type in args.index:
+                for reranker in rerankers:
+                    retriever = chatbot.DuckDBEmbeddingRetriever(
+                        db_path, top_k=args.k, index_type=index_type, nprobe=args.nprobe,
+                        mode=mode, use_snapshot=True,
+                    )
+                    result = bench_retriever(
+                        retriever, labelled, query_embeddings, args.k, args.concurrency, reranker
+                    )
+                    name = f"{mode}/{index_type}" + ("+rerank" if reranker is not None else "")
+                    results["retrieval"][name] = result
+                    qps = ", ".join(f"{n}: {v:,.0f}" for n, v in result["qps"].items())
+                    print(
+                        f"{name:<14} | {format_latency(result['latency'])} | "
+                        f"{result[f'recall@{args.k}']:8.3f} | {result['mrr']:.3f} | {qps}"
+                    )
+
+        # 4) /api/chat 전체 경로 - chatbot.py 설정(RETRIEVER_MODE 등)과 같은 리트리버 + Gemini 스텁
+        if not args.skip_e2e:
+            stub, endpoint = start_gemini_stub(args.llm_latency_ms)
+            os.environ.setdefault("GOOGLE_API_KEY", "bench")
+            chatbot.GEMINI_ENDPOINT = endpoint
+            chatbot.GEMINI_RPS = 1000.0
+            chatbot.GEMINI_BURST = 1000
+            chatbot.gemini_client = None
+            chatbot.answer_cache = chatbot.SemanticAnswerCache(max_entries=0)
+            chatbot.text_embedder = chatbot.CachedTextEmbedder(text_embedder, max_entries=0)
+            chatbot.retriever = chatbot.DuckDBEmbeddingRetriever(
+                db_path, top_k=args.k, index_type=chatbot.RETRIEVER_INDEX, nprobe=chatbot.IVF_NPROBE,
+                mode=chatbot.RETRIEVER_MODE, candidates=chatbot.LEXICAL_CANDIDATES,
+                prefilter=chatbot.LEXICAL_PREFILTER, use_snapshot=True,
+            )
+            chatbot.retriever.refresh()
+            chatbot.prompt_builder = chatbot.PromptBuilder(
+                template=chatbot.PROMPT_TEMPLATE, required_variables=["documents", "question"]
+            )
+            chatbot.startup_state["ready"] = True
+
+            questions = [q for q, _ in labelled]
+            # 요청마다 찍히는 chatbot.py 로그는 --verbose일 때만
+            with open(os.devnull, "w") as devnull:
+                with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+                    results["end_to_end"] = bench_end_to_end(chatbot, questions, args.concurrency)
+            print(f"\n🌐 /api/chat 전체 경로 (Gemini 스텁 {args.llm_latency_ms:.0f}ms, 동시 처리 한도 {chatbot.RAG_MAX_INFLIGHT})")
+            for n, result in results["end_to_end"].items():
+                print(f"   동시 {n:>3} | {format_latency(result['latency'])} | {result['qps']:6.1f} QPS | 혼잡 응답 {result['busy']}개")
+
+        # 5) 메모리
+        results["max_rss_mb"] = round(max_rss_mb(), 1)
+        print(f"\n🧠 질문 임베딩 평균 {results['query_embed_ms']}ms, 최대 RSS {results['max_rss_mb']}MB")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"💾 결과 저장: {args.json}")
+    finally:
+        if stub is not None:
+            stub.shutdown()
+        if args.keep:
+            print(f"📁 임시 DB 유지: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
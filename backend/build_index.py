@@ -7,11 +7,37 @@ import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image
 import io
+import hashlib
+import itertools
+import re
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pyarrow as pa
 
 from haystack import Document
-from haystack.components.preprocessors import DocumentSplitter
 from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 
+from ann_index import build_and_save, ivf_index_path
+from vector_store import (
+    EMBEDDING_DIM,
+    META_COLUMNS,
+    arrow_embeddings_to_matrix,
+    embedding_snapshot_current,
+    export_embedding_snapshot,
+    filtered_select,
+    is_normalized,
+    load_embedding_matrix,
+    meta_columns_arrays,
+    normalize_rows,
+    parse_date,
+    setup_tables,
+)
+
 
 # ------------------------------
 # 1. 경로 설정
@@ -19,53 +45,270 @@ from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "hibot_store.db")
 DATA_PATH = os.path.join(BASE_DIR, "../hibot-chat-docs-pdf")
+# (선택) 파일별 문서 정보 {"파일명.pdf": {"title": "보수규정", "department": "인사팀", "effective_date": "2024-03-01"}}
+# 없는 항목은 파일 이름에서 추정한다 (예: "보수규정_2024.03.01.pdf" → 보수규정 / 2024-03-01)
+METADATA_FILE = "metadata.json"
 
 EMBEDDING_MODEL = "jhgan/ko-sbert-nli"
 
+# --workers 모드에서 워커 하나가 한 번에 처리할 페이지 수
+PAGES_PER_TASK = 4
+
+# 청크 크기 (단어 수) / 앞 청크와 겹치는 단어 수
+SPLIT_LENGTH = 700
+SPLIT_OVERLAP = 150
+
+# 한 번에 임베딩/저장하는 청크 수 (여러 파일의 청크를 모아 이 크기로 임베딩)
+EMBED_BATCH_SIZE = 64
+
+# OCR 설정 / 결과 캐시 위치 (워커 프로세스끼리도 공유되도록 디스크에 저장)
+OCR_LANG = "kor+eng"
+OCR_CACHE_DIR = os.path.join(BASE_DIR, "ocr_cache")
+
+# --ocr-mode auto 판단 기준
+# - 페이지 텍스트가 MIN_PAGE_TEXT_CHARS 이상이면 "디지털 텍스트 페이지"로 보고 큰 이미지만 OCR
+# - 텍스트가 거의 없고 이미지가 페이지의 SCANNED_IMAGE_COVERAGE 이상을 덮으면 "스캔 페이지"
+# - 페이지 면적의 MIN_IMAGE_AREA_RATIO 미만이거나 MIN_IMAGE_PX 미만인 이미지는 장식으로 보고 건너뜀
+MIN_PAGE_TEXT_CHARS = 200
+SCANNED_IMAGE_COVERAGE = 0.5
+LARGE_IMAGE_AREA_RATIO = 0.3
+MIN_IMAGE_AREA_RATIO = 0.02
+MIN_IMAGE_PX = 64
+
 
 # ------------------------------
 # 2. DuckDB Document Store
 # ------------------------------
 class DuckDBDocumentStore:
-    def __init__(self, db_path):
+    # normalize=True: 임베딩을 단위 벡터로 저장 (검색 시 정규화 생략)
+    def __init__(self, db_path, dim=EMBEDDING_DIM, normalize=False):
         self.conn = duckdb.connect(db_path)
-        self._setup_tables()
+        self.dim = dim
+        self._setup_tables(normalize)
+
+        # DB 저장 누적 통계 (rows/s 보고용)
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self.verbose = True  # 배치마다 저장 결과 출력
+
+    def _setup_tables(self, normalize=False):
+        # 예전 DOUBLE[] 스키마는 여기서 FLOAT[dim]으로 제자리 마이그레이션된다
+        setup_tables(self.conn, dim=self.dim, normalize=normalize)
 
-    def _setup_tables(self):
+        # 증분 색인용 매니페스트 (파일 내용 해시 / 페이지별 해시 + 추출 텍스트)
+        # embedding 컬럼을 읽지 않고도 "무엇이 색인되어 있는지" 알 수 있다
         self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id TEXT PRIMARY KEY,
-                content TEXT,
-                meta TEXT,
-                embedding DOUBLE[]
+            CREATE TABLE IF NOT EXISTS file_manifest (
+                file_name TEXT PRIMARY KEY,
+                file_hash TEXT,
+                page_count INTEGER,
+                indexed_at TIMESTAMP DEFAULT current_timestamp
             )
         """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_manifest (
+                file_name TEXT,
+                page_number INTEGER,
+                page_hash TEXT,
+                page_text TEXT,
+                extract_method TEXT,
+                PRIMARY KEY (file_name, page_number)
+            )
+        """)
+        # 추출 방식 컬럼이 생기기 전에 만든 매니페스트 업그레이드
+        self.conn.execute("ALTER TABLE page_manifest ADD COLUMN IF NOT EXISTS extract_method TEXT")
+        # 한 번 정규화된 저장소는 이후에도 계속 정규화해서 저장
+        self.normalize = is_normalized(self.conn)
         self.conn.commit()
 
-    def write_documents(self, documents):
-        for doc in documents:
-            meta_json = json.dumps(doc.meta) if doc.meta else "{}"
+    def _to_arrow_table(self, documents):
+        """청크 목록 → Arrow 테이블 (id, content, meta, embedding FLOAT[dim], 메타 컬럼)"""
+        # 같은 id가 한 배치에 두 번 있으면 마지막 것만 남긴다 (덮어쓰기와 동일한 결과)
+        unique_docs = list({str(doc.id): doc for doc in documents}.values())
 
-            # embedding → Python list로 처리
-            if doc.embedding is not None:
-                if hasattr(doc.embedding, "tolist"):
-                    embed_list = doc.embedding.tolist()
-                else:
-                    embed_list = list(doc.embedding)
-            else:
-                embed_list = None
+        has_embedding = np.array([doc.embedding is not None for doc in unique_docs])
+        matrix = np.zeros((len(unique_docs), self.dim), dtype=np.float32)
+        if has_embedding.any():
+            embedded = np.asarray(
+                [doc.embedding for doc in unique_docs if doc.embedding is not None],
+                dtype=np.float32,
+            )
+            if embedded.ndim != 2 or embedded.shape[1] != self.dim:
+                raise ValueError(f"임베딩 차원이 {self.dim}이 아닙니다: {embedded.shape}")
+            if self.normalize:
+                embedded = normalize_rows(embedded)
+            matrix[has_embedding] = embedded
+
+        embeddings = pa.FixedSizeListArray.from_arrays(
+            pa.array(matrix.reshape(-1)), self.dim, mask=pa.array(~has_embedding)
+        )
+        return pa.table({
+            "id": [str(doc.id) for doc in unique_docs],
+            "content": [doc.content for doc in unique_docs],
+            "meta": [json.dumps(doc.meta) if doc.meta else "{}" for doc in unique_docs],
+            "embedding": embeddings,
+            **meta_columns_arrays([doc.meta for doc in unique_docs]),
+        })
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _insert_documents(self, documents):
+        """Arrow 테이블로 모아 INSERT 한 번 (트랜잭션 안에서 호출)"""
+        start = time.perf_counter()
+        staged = self._to_arrow_table(documents)
+
+        # 인덱스가 걸린 컬럼은 INSERT OR REPLACE로 바뀌지 않으므로 같은 id를 지우고 다시 넣는다
+        columns = ", ".join(["id", "content", "meta", "embedding", *META_COLUMNS])
+        self.conn.register("staged_documents", staged)
+        try:
+            self.conn.execute("DELETE FROM documents WHERE id IN (SELECT id FROM staged_documents)")
+            self.conn.execute(f"""
+                INSERT INTO documents ({columns})
+                SELECT {columns} FROM staged_documents
+            """)
+        finally:
+            self.conn.unregister("staged_documents")
+
+        elapsed = time.perf_counter() - start
+        self.rows_written += staged.num_rows
+        self.write_seconds += elapsed
+
+        rate = staged.num_rows / elapsed if elapsed > 0 else float("inf")
+        if self.verbose:
+            print(f"✅ {staged.num_rows}개 문서를 DB에 저장했습니다. ({elapsed:.2f}s, {rate:,.0f} rows/s)")
+        return staged.num_rows
 
+    def write_batch(self, documents, page_rows):
+        """청크 배치(여러 파일 가능) + 그동안 추출된 페이지 매니페스트를 한 트랜잭션으로 저장
+
+        page_rows: (file_name, page_number, page_hash, page_text, extract_method)
+        (같은 id의 청크는 덮어쓰므로 중간에 실패해도 다음 실행에서 그대로 이어서 정리된다)
+        """
+        with self._transaction():
+            rows = self._insert_documents(documents) if documents else 0
+            if page_rows:
+                self.conn.executemany("""
+                    INSERT OR REPLACE INTO page_manifest
+                        (file_name, page_number, page_hash, page_text, extract_method)
+                    VALUES (?, ?, ?, ?, ?)
+                """, page_rows)
+        return rows
+
+    def finalize_file(self, file_name, file_hash, page_count, chunk_ids):
+        """파일 색인 마무리: 이번에 만들지 않은 예전 청크/페이지 삭제 + 파일 해시 기록"""
+        with self._transaction():
             self.conn.execute("""
-                INSERT OR REPLACE INTO documents (id, content, meta, embedding)
-                VALUES (?, ?, ?, ?)
-            """, (str(doc.id), doc.content, meta_json, embed_list))
+                DELETE FROM documents
+                WHERE file_name = ?
+                  AND id NOT IN (SELECT UNNEST(?::VARCHAR[]))
+            """, [file_name, list(chunk_ids)])
+            self.conn.execute(
+                "DELETE FROM page_manifest WHERE file_name = ? AND page_number >= ?",
+                [file_name, page_count],
+            )
+            self._record_file(file_name, file_hash, page_count)
 
-        self.conn.commit()
-        print(f"✅ {len(documents)}개 문서를 DB에 저장했습니다.")
+    # ------------------------------
+    # 매니페스트 (증분 색인)
+    # ------------------------------
+    def _record_file(self, file_name, file_hash, page_count=None):
+        self.conn.execute("""
+            INSERT OR REPLACE INTO file_manifest (file_name, file_hash, page_count, indexed_at)
+            VALUES (?, ?, ?, current_timestamp)
+        """, (file_name, file_hash, page_count))
+
+    def _delete_file_rows(self, file_name):
+        self.conn.execute("DELETE FROM documents WHERE file_name = ?", [file_name])
+        self.conn.execute("DELETE FROM page_manifest WHERE file_name = ?", [file_name])
+        self.conn.execute("DELETE FROM file_manifest WHERE file_name = ?", [file_name])
+
+    def adopt_file(self, file_name, file_hash):
+        """매니페스트 도입 전에 색인된 파일: 현재 해시만 기록하고 기존 청크는 그대로 둔다"""
+        self._record_file(file_name, file_hash)
+
+    def delete_file(self, file_name):
+        """폴더에서 사라진 파일의 청크와 매니페스트 삭제"""
+        with self._transaction():
+            self._delete_file_rows(file_name)
+        print(f"🗑️ 삭제된 파일의 청크 제거: {file_name}")
+
+    def get_file_manifest(self):
+        """{file_name: file_hash}"""
+        return dict(self.conn.execute("SELECT file_name, file_hash FROM file_manifest").fetchall())
+
+    def get_indexed_file_names(self):
+        """documents에 청크가 있는 파일 이름 (embedding 컬럼은 읽지 않음)"""
+        rows = self.conn.execute("""
+            SELECT DISTINCT file_name
+            FROM documents
+            WHERE file_name IS NOT NULL
+        """).fetchall()
+        return {row[0] for row in rows}
+
+    def get_page_manifest(self, file_name):
+        """{page_number: (page_hash, page_text, extract_method)}"""
+        rows = self.conn.execute("""
+            SELECT page_number, page_hash, page_text, extract_method
+            FROM page_manifest
+            WHERE file_name = ?
+        """, [file_name]).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def get_chunk_embeddings(self, file_name, contents):
+        """본문이 같은 기존 청크의 임베딩 {본문 해시: 벡터} - 다시 임베딩하지 않기 위해 사용"""
+        table = self.conn.execute("""
+            SELECT content, embedding
+            FROM documents
+            WHERE file_name = ?
+              AND embedding IS NOT NULL
+              AND content IN (SELECT UNNEST(?::VARCHAR[]))
+        """, [file_name, list(contents)]).fetch_arrow_table()
+        matrix = arrow_embeddings_to_matrix(table.column("embedding"))
+        contents = table.column("content").to_pylist()
+        return {content_hash(content): matrix[i] for i, content in enumerate(contents)}
+
+    def print_write_summary(self):
+        if self.rows_written == 0:
+            return
+        rate = self.rows_written / self.write_seconds if self.write_seconds > 0 else float("inf")
+        print(f"💾 DB 저장 합계: {self.rows_written}개, {self.write_seconds:.2f}s ({rate:,.0f} rows/s)")
+
+    def update_file_metadata(self, file_name, doc_meta):
+        """내용은 그대로인 파일의 문서 정보(규정 이름 / 부서 / 시행일 …)가 바뀌었으면 청크 메타만 고친다
+
+        반환: 고친 청크 수
+        """
+        with self._transaction():
+            return self.conn.execute("""
+                UPDATE documents
+                SET doc_title = ?, department = ?, effective_date = ?::DATE, doc_hash = ?,
+                    meta = json_merge_patch(meta, ?)
+                WHERE file_name = ?
+                  AND (doc_title IS DISTINCT FROM ? OR department IS DISTINCT FROM ?
+                       OR effective_date IS DISTINCT FROM ?::DATE OR doc_hash IS DISTINCT FROM ?)
+            """, [
+                doc_meta["doc_title"], doc_meta["department"], doc_meta["effective_date"], doc_meta["doc_hash"],
+                json.dumps(doc_meta, ensure_ascii=False), file_name,
+                doc_meta["doc_title"], doc_meta["department"], doc_meta["effective_date"], doc_meta["doc_hash"],
+            ]).fetchone()[0]
 
     def filter_documents(self, filters=None):
-        query = "SELECT id, content, meta, embedding FROM documents"
-        result = self.conn.execute(query).fetchall()
+        """Haystack 2 필터로 문서 조회 (메타 컬럼 조건은 DuckDB 스캔에서 걸러진다)
+
+        예) {"field": "meta.doc_title", "operator": "==", "value": "보수규정"}
+            {"field": "meta.is_current", "operator": "==", "value": True}  ← 현행 개정판만
+        잘못된 필터는 ValueError
+        """
+        query, params = filtered_select("documents", "id, content, meta, embedding", filters)
+        result = self.conn.execute(query + " ORDER BY id", params).fetchall()
 
         documents = []
         for row in result:
@@ -76,12 +319,14 @@ class DuckDBDocumentStore:
                 id=doc_id,
                 content=content,
                 meta=meta,
-                embedding=embedding
+                embedding=list(embedding) if embedding is not None else None
             ))
         return documents
 
     def delete_all_documents(self):
         self.conn.execute("DELETE FROM documents")
+        self.conn.execute("DELETE FROM page_manifest")
+        self.conn.execute("DELETE FROM file_manifest")
         self.conn.commit()
         print("🗑️ 모든 문서를 삭제했습니다.")
 
@@ -92,116 +337,738 @@ class DuckDBDocumentStore:
 # ------------------------------
 # 3. OCR 지원 PDF → Text 변환기
 # ------------------------------
-def extract_text_with_ocr(pdf_path):
-    doc = fitz.open(pdf_path)
-    full_text = ""
+class OCRCache:
+    """이미지 바이트 해시 + 언어 설정을 키로 하는 OCR 결과 캐시
+
+    로고/직인/반복 첨부 페이지처럼 같은 이미지는 Tesseract를 다시 돌리지 않는다.
+    파일 하나에 결과 하나를 쓰고 os.replace로 교체하므로 여러 워커가 동시에 써도 안전하다.
+    """
+
+    def __init__(self, cache_dir, lang=OCR_LANG):
+        self.cache_dir = cache_dir
+        self.lang = lang
+
+    def _path(self, image_bytes):
+        key = hashlib.sha256(image_bytes).hexdigest()
+        lang_tag = self.lang.replace("+", "_")
+        return os.path.join(self.cache_dir, key[:2], f"{key}-{lang_tag}.txt")
+
+    def get(self, image_bytes):
+        try:
+            with open(self._path(image_bytes), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
 
-    for page in doc:
-        # (1) 일반 텍스트 추출
-        full_text += page.get_text("text") + "\n"
+    def put(self, image_bytes, text):
+        path = self._path(image_bytes)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
 
-        # (2) 이미지 OCR 처리
-        for img in page.get_images(full=True):
-            xref = img[0]
-            base = doc.extract_image(xref)
-            image_bytes = base["image"]
 
-            image = Image.open(io.BytesIO(image_bytes))
-            ocr_text = pytesseract.image_to_string(image, lang="kor+eng")
-            full_text += ocr_text + "\n"
+ocr_cache = OCRCache(OCR_CACHE_DIR)
 
-    return full_text
+
+def new_extract_stats():
+    """추출 통계 (워커에서 메인 프로세스로 돌려보내 합산)"""
+    return {
+        "ocr_seconds": 0.0,
+        "ocr_cache_hits": 0,
+        "ocr_cache_misses": 0,
+        "ocr_images_skipped": 0,
+        "ocr_pages_rendered": 0,
+    }
+
+
+def merge_extract_stats(total, stats):
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def ocr_image(image_bytes, stats):
+    """캐시에 있으면 그대로, 없으면 Tesseract 실행 후 캐시에 저장"""
+    cached = ocr_cache.get(image_bytes)
+    if cached is not None:
+        stats["ocr_cache_hits"] += 1
+        return cached
+
+    stats["ocr_cache_misses"] += 1
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    ocr_text = pytesseract.image_to_string(image, lang=ocr_cache.lang)
+    stats["ocr_seconds"] += time.perf_counter() - start
+
+    ocr_cache.put(image_bytes, ocr_text)
+    return ocr_text
+
+
+def measure_page(page):
+    """페이지의 텍스트 양 / 이미지별 면적 비율 (xref → 페이지 대비 면적)"""
+    page_area = abs(page.rect) or 1.0
+    text_chars = len(page.get_text("text").strip())
+
+    image_ratios = {}
+    for info in page.get_image_info(xrefs=True):
+        xref = info.get("xref")
+        if not xref:
+            continue
+        ratio = abs(fitz.Rect(info["bbox"]) & page.rect) / page_area
+        image_ratios[xref] = max(image_ratios.get(xref, 0.0), ratio)
+
+    image_coverage = min(1.0, sum(image_ratios.values()))
+    return text_chars, image_ratios, image_coverage
+
+
+def select_ocr_images(page, text_chars, image_ratios):
+    """auto 모드에서 OCR할 이미지 xref 목록 (장식용 작은 이미지는 제외)"""
+    min_ratio = LARGE_IMAGE_AREA_RATIO if text_chars >= MIN_PAGE_TEXT_CHARS else MIN_IMAGE_AREA_RATIO
+
+    selected = []
+    for img in page.get_images(full=True):
+        xref, width, height = img[0], img[2], img[3]
+        if width < MIN_IMAGE_PX or height < MIN_IMAGE_PX:
+            continue
+        if image_ratios.get(xref, 0.0) < min_ratio:
+            continue
+        selected.append(xref)
+    return selected
+
+
+def extract_page_text(doc, page, stats, ocr_mode="all", ocr_dpi=0):
+    """한 페이지의 텍스트 + 이미지 OCR 결과와 사용한 추출 방식
+
+    ocr_mode="all" : 모든 이미지를 OCR (기존 동작)
+    ocr_mode="auto": 텍스트 밀도/이미지 면적으로 스캔 페이지·큰 이미지만 OCR,
+                     ocr_dpi > 0이면 스캔 페이지는 이미지별 OCR 대신 페이지를 한 번 렌더링해 OCR
+    방식: "text" | "text+ocr" | "ocr_page"
+    (OCR 시간/캐시 통계는 stats에 누적)
+    """
+    # (1) 일반 텍스트 추출
+    page_text = page.get_text("text") + "\n"
+
+    if ocr_mode == "auto":
+        text_chars, image_ratios, image_coverage = measure_page(page)
+
+        # 스캔 페이지 → 페이지 전체를 한 번만 렌더링해서 OCR
+        is_scanned = text_chars < MIN_PAGE_TEXT_CHARS and image_coverage >= SCANNED_IMAGE_COVERAGE
+        if is_scanned and ocr_dpi > 0:
+            image_bytes = page.get_pixmap(dpi=ocr_dpi).tobytes("png")
+            stats["ocr_pages_rendered"] += 1
+            stats["ocr_images_skipped"] += len(page.get_images(full=True))
+            return ocr_image(image_bytes, stats) + "\n", "ocr_page"
+
+        xrefs = select_ocr_images(page, text_chars, image_ratios)
+        stats["ocr_images_skipped"] += len(page.get_images(full=True)) - len(xrefs)
+    else:
+        xrefs = [img[0] for img in page.get_images(full=True)]
+
+    # (2) 이미지 OCR 처리
+    for xref in xrefs:
+        base = doc.extract_image(xref)
+        image_bytes = base["image"]
+
+        ocr_text = ocr_image(image_bytes, stats)
+        page_text += ocr_text + "\n"
+
+    return page_text, ("text+ocr" if xrefs else "text")
+
+
+def extract_pages(pdf_path, page_numbers, ocr_mode="all", ocr_dpi=0):
+    """지정한 페이지들을 순서대로 추출 - 프로세스 풀 워커의 작업 단위
+
+    반환: ({page_number: (page_text, method)}, 추출 통계)
+    """
+    page_texts = {}
+    stats = new_extract_stats()
+    with fitz.open(pdf_path) as doc:
+        for page_number in page_numbers:
+            page_texts[page_number] = extract_page_text(
+                doc, doc[page_number], stats, ocr_mode=ocr_mode, ocr_dpi=ocr_dpi
+            )
+    return page_texts, stats
+
+
+def split_extraction_tasks(pdf_path, page_numbers, ocr_mode="all", ocr_dpi=0,
+                           pages_per_task=PAGES_PER_TASK):
+    """추출할 페이지들을 묶음 단위 작업(extract_pages 인자)으로 나눈다"""
+    page_numbers = list(page_numbers)
+    return [
+        (pdf_path, page_numbers[i:i + pages_per_task], ocr_mode, ocr_dpi)
+        for i in range(0, len(page_numbers), pages_per_task)
+    ]
+
+
+def iter_extraction_results(executor, tasks, window):
+    """작업들을 순서대로 워커 풀에 제출하고 결과를 같은 순서로 내보낸다
+
+    처음 window개는 호출하자마자 제출하고, 그 뒤로는 결과를 하나 가져갈 때마다 하나씩 제출한다
+    → 임베딩이 추출보다 느려도 끝난 작업의 텍스트가 window개 분량 넘게 쌓이지 않는다.
+    """
+    tasks = iter(tasks)
+    in_flight = deque(executor.submit(extract_pages, *task) for task in itertools.islice(tasks, window))
+
+    def results():
+        while in_flight:
+            future = in_flight.popleft()
+            for task in itertools.islice(tasks, 1):
+                in_flight.append(executor.submit(extract_pages, *task))
+            yield future.result()
+    return results()
+
+
+def iter_file_pages(page_count, reused_pages, results, stats):
+    """페이지 순서대로 (page_number, page_text, method)를 하나씩 내보낸다
+
+    reused_pages: 변경이 없어 매니페스트에서 가져온 페이지 {page_number: (text, method)}
+    results     : 나머지 페이지의 추출 결과 (extract_pages 반환값)를 페이지 순서대로 내는 iterable
+                  - 워커 풀이면 future.result(), 아니면 그 자리에서 추출
+    한 번에 작업 하나 분량의 페이지만 메모리에 둔다.
+    """
+    results = iter(results)
+    extracted = {}
+    for page_number in range(page_count):
+        if page_number in reused_pages:
+            text, method = reused_pages[page_number]
+        else:
+            while page_number not in extracted:
+                texts, task_stats = next(results)
+                extracted.update(texts)
+                merge_extract_stats(stats, task_stats)
+            text, method = extracted.pop(page_number)
+        yield page_number, text, method
 
 
 # ------------------------------
-# 4. PDF → Haystack Document 변환
+# 3-1. 변경 감지용 해시
 # ------------------------------
-def convert_pdf_to_documents(pdf_path, file_name):
-    text = extract_text_with_ocr(pdf_path)
-    return [
-        Document(
-            content=text,
-            meta={"file_name": file_name}
+def hash_file(path):
+    """파일 내용 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_pages(pdf_path):
+    """페이지별 내용 해시 (그리기 명령 + 텍스트 + 이미지 원본 바이트) - OCR 없이 계산"""
+    page_hashes = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            digest = hashlib.sha256(page.read_contents())
+            digest.update(page.get_text("text").encode("utf-8"))
+            for img in page.get_images(full=True):
+                digest.update(doc.xref_stream_raw(img[0]) or b"")
+            page_hashes.append(digest.hexdigest())
+    return page_hashes
+
+
+def content_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+# ------------------------------
+# 3-2. 파일 단위 문서 정보 (필터 검색용 메타)
+# ------------------------------
+def load_file_metadata(path=None):
+    """DATA_PATH/metadata.json → {file_name: {...}} (없거나 깨졌으면 빈 dict)"""
+    path = path or os.path.join(DATA_PATH, METADATA_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ 문서 정보 파일을 읽지 못했습니다 → 파일 이름에서 추정합니다: {e}")
+        return {}
+
+
+def file_doc_meta(file_name, file_hash, sidecar=None):
+    """청크 meta에 넣을 파일 단위 정보 (metadata.json 우선, 없으면 파일 이름에서 추정)
+
+    "보수규정_2024.03.01.pdf" → doc_title "보수규정", effective_date "2024-03-01"
+    """
+    entry = (sidecar or {}).get(file_name) or {}
+    stem = os.path.splitext(file_name)[0]
+    date_match = re.search(r"(?<!\d)(\d{4})[-._]?(\d{1,2})[-._]?(\d{1,2})(?!\d)", stem)
+
+    effective_date = parse_date(entry.get("effective_date"))
+    if effective_date is None and date_match:
+        effective_date = parse_date("-".join(date_match.groups()))
+
+    title = entry.get("title")
+    if not title:
+        title = stem[:date_match.start()] + stem[date_match.end():] if date_match else stem
+        title = re.sub(r"[\s_\-()\[\]]+", " ", title).strip() or stem
+
+    return {
+        "doc_title": title,
+        "department": entry.get("department"),
+        "effective_date": effective_date.isoformat() if effective_date else None,
+        "doc_hash": file_hash,
+    }
+
+
+# ------------------------------
+# 4. 페이지 스트림 → 청크(Haystack Document) 스트림
+# ------------------------------
+def make_chunk(file_name, split_id, window, doc_meta=None):
+    """window: (단어, 페이지 번호, 추출 방식) 목록 → 페이지 범위가 담긴 Document
+
+    doc_meta: 파일 단위 문서 정보 (doc_title / department / effective_date / doc_hash)
+    """
+    page_start = window[0][1] + 1  # 메타의 페이지 번호는 1부터
+    page_end = window[-1][1] + 1
+    return Document(
+        content=" ".join(word for word, _, _ in window),
+        meta={
+            "file_name": file_name,
+            "page_number": page_start,
+            "page_start": page_start,
+            "page_end": page_end,
+            "split_id": split_id,
+            "extraction_methods": sorted({method for _, _, method in window}),
+            **(doc_meta or {}),
+        },
+    )
+
+
+def iter_page_chunks(pages, file_name, split_length=SPLIT_LENGTH, split_overlap=SPLIT_OVERLAP, doc_meta=None):
+    """페이지 스트림을 단어 기준 청크로 나눈다 (페이지 경계를 넘어 split_overlap 단어씩 겹침)
+
+    메모리에는 청크 하나 분량(split_length 단어)만 유지한다.
+    """
+    window = deque()
+    new_words = 0  # 아직 어느 청크에도 들어가지 않은 단어 수
+    split_id = 0
+
+    for page_number, text, method in pages:
+        for word in text.split(" "):
+            if not word.strip():
+                continue
+            window.append((word, page_number, method))
+            new_words += 1
+
+            if len(window) == split_length:
+                yield make_chunk(file_name, split_id, list(window), doc_meta)
+                split_id += 1
+                for _ in range(split_length - split_overlap):
+                    window.popleft()
+                new_words = 0
+
+    if new_words:
+        yield make_chunk(file_name, split_id, list(window), doc_meta)
+
+
+def record_pages(pages, file_name, page_hashes, page_rows):
+    """페이지 스트림을 그대로 흘려보내면서 매니페스트에 쓸 행을 page_rows에 모은다"""
+    for page_number, text, method in pages:
+        page_rows.append((file_name, page_number, page_hashes[page_number], text, method))
+        yield page_number, text, method
+
+
+class StageTimer:
+    """색인 단계별 소요 시간 누적 (추출/OCR, 분할, 임베딩, DB 저장)"""
+
+    def __init__(self):
+        self.seconds = {}
+        self._child_seconds = []  # 중첩 측정 시 안쪽 단계 시간은 바깥 단계에서 뺀다
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        self._child_seconds.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(stage, elapsed - self._child_seconds.pop())
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+
+    def timed(self, iterable, stage):
+        """제너레이터의 next() 호출 시간을 stage로 누적 (스트리밍 단계 측정용)"""
+        iterator = iter(iterable)
+        while True:
+            with self.measure(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self):
+        print("⏱️ 단계별 소요 시간")
+        for stage, seconds in self.seconds.items():
+            print(f"   - {stage}: {seconds:.2f}s")
+
+
+# ------------------------------
+# 4-1. 파일 간 임베딩 큐
+# ------------------------------
+def create_document_embedder(batch_size=EMBED_BATCH_SIZE, threads=None, backend="torch", model_file=None):
+    """문서 임베딩 모델 생성
+
+    threads   : CPU 연산 스레드 수 (None이면 라이브러리 기본값)
+    backend   : "torch" | "onnx" | "openvino" (sentence-transformers 백엔드)
+    model_file: onnx/openvino 백엔드에서 쓸 모델 파일 (예: "onnx/model_qint8_avx2.onnx" 양자화 모델)
+    """
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    model_kwargs = {"file_name": model_file} if model_file else None
+    embedder = SentenceTransformersDocumentEmbedder(
+        model=EMBEDDING_MODEL,
+        batch_size=batch_size,
+        progress_bar=False,
+        backend=backend,
+        model_kwargs=model_kwargs,
+    )
+    embedder.warm_up()
+    return embedder
+
+
+class EmbeddingQueue:
+    """여러 PDF의 청크를 모아 고정 크기 배치로 임베딩하고 저장하는 큐
+
+    - 작은 파일 여러 개는 한 배치로 묶고, 큰 파일은 batch_size 단위로 나눠서 처리
+    - 본문이 같은 기존 청크는 임베딩을 재사용
+    - 파일의 청크가 모두 저장되면 finalize_file로 예전 청크를 정리
+    """
+
+    def __init__(self, store, embedder, timer, batch_size=EMBED_BATCH_SIZE):
+        self.store = store
+        self.embedder = embedder
+        self.timer = timer
+        self.batch_size = batch_size
+
+        self.pending = []      # 임베딩 대기 중인 청크
+        self.page_rows = []    # 다음 저장 때 함께 쓸 페이지 매니페스트 행
+        self.files = {}        # file_name → 지금까지 저장한 청크 id set (파일 마무리 전까지)
+        self.closed = {}       # 청크 입력이 끝난 파일 → (file_hash, page_count)
+
+        self.embedded_count = 0
+        self.reused_count = 0
+        self.embed_seconds = 0.0
+        self.batches = 0
+
+    def add_file(self, file_name):
+        self.files[file_name] = set()
+
+    def add(self, doc):
+        self.pending.append(doc)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def close_file(self, file_name, file_hash, page_count):
+        """파일의 모든 청크를 넣었음 - 남은 청크가 저장되면 마무리된다"""
+        self.closed[file_name] = (file_hash, page_count)
+
+    def flush(self, final=False):
+        """대기 중인 청크를 batch_size씩 임베딩 → 저장 (final=True면 남은 것 전부)"""
+        while self.pending and (final or len(self.pending) >= self.batch_size):
+            batch = self.pending[:self.batch_size]
+            del self.pending[:self.batch_size]
+
+            with self.timer.measure("임베딩"):
+                batch = self._embed(batch)
+            with self.timer.measure("DB 저장"):
+                self.store.write_batch(batch, self.page_rows)
+            self.page_rows.clear()
+            for doc in batch:
+                self.files[doc.meta["file_name"]].add(doc.id)
+
+        self._finalize_closed_files(final)
+
+    def _embed(self, batch):
+        # (a) 파일별로 본문이 같은 기존 청크의 임베딩 찾기
+        by_file = {}
+        for doc in batch:
+            by_file.setdefault(doc.meta["file_name"], []).append(doc)
+        for file_name, docs in by_file.items():
+            cached = self.store.get_chunk_embeddings(file_name, [doc.content for doc in docs])
+            for doc in docs:
+                doc.embedding = cached.get(content_hash(doc.content))
+
+        # (b) 나머지만 한 번에 임베딩
+        to_embed = [doc for doc in batch if doc.embedding is None]
+        if to_embed:
+            start = time.perf_counter()
+            embedded = iter(self.embedder.run(to_embed)["documents"])
+            self.embed_seconds += time.perf_counter() - start
+            batch = [doc if doc.embedding is not None else next(embedded) for doc in batch]
+
+        self.embedded_count += len(to_embed)
+        self.reused_count += len(batch) - len(to_embed)
+        self.batches += 1
+        return batch
+
+    def _finalize_closed_files(self, final):
+        waiting = {doc.meta["file_name"] for doc in self.pending}
+        for file_name in list(self.closed):
+            if file_name in waiting and not final:
+                continue
+            file_hash, page_count = self.closed.pop(file_name)
+            with self.timer.measure("DB 저장"):
+                # 남은 페이지 매니페스트 + 예전 청크 정리 + 파일 해시 기록
+                self.store.write_batch([], self.page_rows)
+                self.page_rows.clear()
+                self.store.finalize_file(file_name, file_hash, page_count, self.files.pop(file_name))
+            print(f"✅ 색인 완료: {file_name}")
+
+    def report(self):
+        rate = self.embedded_count / self.embed_seconds if self.embed_seconds > 0 else 0.0
+        print(
+            f"🧠 임베딩: {self.embedded_count}개 새로 계산 / {self.reused_count}개 재사용, "
+            f"배치 {self.batches}개 (크기 {self.batch_size}), {rate:,.1f} chunks/s"
         )
-    ]
 
 
 # ------------------------------
-# 5. 메인 색인 로직
+# 5. ANN(IVF) 색인 생성
+# ------------------------------
+def build_ann_index(store, nlist=None):
+    """DB의 전체 임베딩으로 IVF 색인을 만들어 hibot_store.ivf.npz 로 저장"""
+    ids, _, matrix = load_embedding_matrix(store.conn, with_meta=False)
+    if len(ids) == 0:
+        print("⚠️ 임베딩이 없어 IVF 색인을 만들지 않습니다.")
+        return
+    build_and_save(matrix, ids, ivf_index_path(DB_PATH), nlist=nlist)
+
+
+# ------------------------------
+# 6. 메인 색인 로직
 # ------------------------------
-def main(force_rebuild=False):
+def main(force_rebuild=False, build_ann=False, nlist=None, normalize=False, workers=1,
+         ocr_mode="all", ocr_dpi=0, embed_batch_size=EMBED_BATCH_SIZE, embed_threads=None,
+         embed_backend="torch", embed_model_file=None):
     print("DATA_PATH:", DATA_PATH)
     print("문서 색인을 시작합니다...")
 
     # 1) DB 초기화
-    store = DuckDBDocumentStore(DB_PATH)
+    store = DuckDBDocumentStore(DB_PATH, normalize=normalize)
 
     # --force 옵션이면 전체 삭제
     if force_rebuild:
         print("⚠️ --force 옵션 감지 → 전체 문서 삭제 중…")
         store.delete_all_documents()
 
-    # DB에 저장된 파일 목록
-    existing_docs = store.filter_documents()
-    indexed_files = {d.meta.get("file_name") for d in existing_docs if d.meta.get("file_name")}
+    # DB에 저장된 파일 목록 (매니페스트만 조회, embedding 컬럼은 읽지 않음)
+    manifest = store.get_file_manifest()
+    # 매니페스트 도입 전에 색인된 파일 (documents에는 있지만 해시 기록이 없음)
+    legacy_files = store.get_indexed_file_names() - set(manifest)
 
-    print(f"✅ DB에 기록된 PDF 파일 수: {len(indexed_files)}")
+    print(f"✅ DB에 기록된 PDF 파일 수: {len(set(manifest) | legacy_files)}")
 
     # 실제 폴더에 존재하는 PDF 목록
     if not os.path.exists(DATA_PATH):
         print("❌ PDF 폴더가 없습니다:", DATA_PATH)
         return
 
-    pdf_files = {f for f in os.listdir(DATA_PATH) if f.endswith(".pdf")}
-    new_files = pdf_files - indexed_files
+    pdf_files = sorted(f for f in os.listdir(DATA_PATH) if f.endswith(".pdf"))
+
+    # (a) 폴더에서 사라진 파일 → 청크 삭제
+    deleted_files = sorted((set(manifest) | legacy_files) - set(pdf_files))
+    for file_name in deleted_files:
+        store.delete_file(file_name)
+
+    # (b) 내용 해시로 새 파일 / 수정된 파일 찾기
+    # 내용이 그대로인 파일은 문서 정보(metadata.json / 파일 이름)만 바뀌었는지 확인해 메타만 고친다
+    sidecar = load_file_metadata()
+    changed_files = {}
+    doc_metas = {}
+    meta_updated = 0
+    for file_name in pdf_files:
+        file_hash = hash_file(os.path.join(DATA_PATH, file_name))
+        doc_metas[file_name] = file_doc_meta(file_name, file_hash, sidecar)
+        if manifest.get(file_name) == file_hash:
+            meta_updated += store.update_file_metadata(file_name, doc_metas[file_name])
+            continue
+        if file_name in legacy_files:
+            # 기존 청크를 그대로 쓰고 해시만 기록 → 다음 수정부터 변경 감지
+            store.adopt_file(file_name, file_hash)
+            meta_updated += store.update_file_metadata(file_name, doc_metas[file_name])
+            continue
+        changed_files[file_name] = file_hash
+    if meta_updated:
+        print(f"🏷️ 문서 정보가 바뀐 청크 {meta_updated}개의 메타를 갱신했습니다.")
 
-    if not new_files:
+    if not changed_files:
         print("✅ 새로 색인할 PDF 파일이 없습니다.")
+        # 삭제/메타 갱신 등 DB가 바뀌었으면 스냅샷도 다시 내보낸다 (안 그러면 서버가 지워진 청크를 계속 검색)
+        db_changed = force_rebuild or deleted_files or meta_updated
+        if db_changed or not embedding_snapshot_current(DB_PATH):
+            export_embedding_snapshot(store.conn, DB_PATH)
+        if build_ann:
+            build_ann_index(store, nlist=nlist)
         return
 
-    print(f"🚨 새 PDF 발견 → {len(new_files)}개 색인 시작: {list(new_files)}")
+    print(f"🚨 새로 추가/수정된 PDF 발견 → {len(changed_files)}개 색인 시작: {list(changed_files)}")
 
-    # 문서 분할기
-    splitter = DocumentSplitter(
-        split_by="word",
-        split_length=700,
-        split_overlap=150
-    )
+    timer = StageTimer()
+    extract_stats = new_extract_stats()
 
-    splitter.warm_up()
+    # (c) 페이지 해시 비교 → 바뀐 페이지만 다시 추출(OCR)
+    # 위치가 아니라 해시로 찾는다 (앞쪽에 페이지가 끼거나 빠져 뒤 페이지 번호가 밀려도 재사용)
+    plans = {}
+    with timer.measure("변경 감지"):
+        for file_name in changed_files:
+            page_hashes = hash_pages(os.path.join(DATA_PATH, file_name))
+            previous_by_hash = {
+                page_hash: (page_text, method or "text+ocr")
+                for page_hash, page_text, method in store.get_page_manifest(file_name).values()
+                if page_text is not None
+            }
+            reused_pages = {
+                page_number: previous_by_hash[page_hash]
+                for page_number, page_hash in enumerate(page_hashes)
+                if page_hash in previous_by_hash
+            }
+            pages_to_extract = [i for i in range(len(page_hashes)) if i not in reused_pages]
+            plans[file_name] = (page_hashes, reused_pages, pages_to_extract)
+
+    # --workers N: 임베딩 모델을 올리기 전에 추출/OCR 작업을 워커 풀에 제출해 두고,
+    # 메인 프로세스는 파일 순서대로 결과를 받아 분할 → 임베딩 → 저장만 한다
+    # (미리 제출하는 작업은 워커 수의 2배까지 - 결과를 가져가는 만큼 다음 작업을 제출)
+    executor = None
+    extraction_results = None
+    if workers > 1:
+        print(f"🧵 추출/OCR 워커 {workers}개 사용")
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        tasks = [
+            task
+            for file_name, (_, _, pages_to_extract) in plans.items()
+            for task in split_extraction_tasks(
+                os.path.join(DATA_PATH, file_name), pages_to_extract, ocr_mode, ocr_dpi
+            )
+        ]
+        extraction_results = iter_extraction_results(executor, tasks, window=workers * 2)
 
     # 문서 임베딩 모델
-    embedder = SentenceTransformersDocumentEmbedder(model=EMBEDDING_MODEL)
-    embedder.warm_up()
+    embedder = create_document_embedder(
+        batch_size=embed_batch_size,
+        threads=embed_threads,
+        backend=embed_backend,
+        model_file=embed_model_file,
+    )
 
-    # ✅ 새 파일들 색인
-    for file_name in new_files:
-        print(f"📄 처리 중: {file_name}")
+    # ✅ 새/수정된 파일들 색인
+    # 페이지 추출 → 청크 분할 → (파일 간) 배치 임베딩 → 저장을 스트리밍으로 연결
+    # (파일 크기와 상관없이 embed_batch_size 청크 분량만 메모리에 둔다)
+    queue = EmbeddingQueue(store, embedder, timer, batch_size=embed_batch_size)
+    store.verbose = False
+    try:
+        for file_name, file_hash in changed_files.items():
+            print(f"📄 처리 중: {file_name}")
 
-        pdf_path = os.path.join(DATA_PATH, file_name)
+            pdf_path = os.path.join(DATA_PATH, file_name)
+            page_hashes, reused_pages, pages_to_extract = plans[file_name]
+            if reused_pages:
+                print(f"♻️ 변경 없는 페이지 {len(reused_pages)}/{len(page_hashes)}개는 저장된 텍스트 재사용")
 
-        # (1) OCR 포함 PDF → Document 변환
-        docs = convert_pdf_to_documents(pdf_path, file_name)
+            # (1) OCR 포함 페이지 추출 (바뀐 페이지만)
+            if executor is not None:
+                # 전체 작업 흐름에서 이 파일 몫만 꺼낸다 (파일 순서대로 제출했으므로)
+                task_count = -(-len(pages_to_extract) // PAGES_PER_TASK)
+                results = itertools.islice(extraction_results, task_count)
+            else:
+                results = (
+                    extract_pages(pdf_path, pages_to_extract[i:i + PAGES_PER_TASK], ocr_mode, ocr_dpi)
+                    for i in range(0, len(pages_to_extract), PAGES_PER_TASK)
+                )
+            file_stats = new_extract_stats()
+            pages = timer.timed(
+                record_pages(
+                    iter_file_pages(len(page_hashes), reused_pages, results, file_stats),
+                    file_name, page_hashes, queue.page_rows,
+                ),
+                "추출/OCR",
+            )
 
-        # (2) 문장 단위 chunking
-        split_docs = splitter.run(docs)["documents"]
+            # (2) 단어 단위 chunking (페이지 범위 메타 포함) → (3)(4) 임베딩 큐
+            queue.add_file(file_name)
+            chunks = iter_page_chunks(pages, file_name, doc_meta=doc_metas[file_name])
+            for doc in timer.timed(chunks, "분할"):
+                queue.add(doc)
+            queue.close_file(file_name, file_hash, len(page_hashes))
 
-        # (3) 임베딩
-        embedded_docs = embedder.run(split_docs)["documents"]
+            if executor is not None:
+                timer.add("OCR (워커 합계)", file_stats["ocr_seconds"])
+            merge_extract_stats(extract_stats, file_stats)
 
-        # (4) DB 저장
-        store.write_documents(embedded_docs)
+        queue.flush(final=True)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-    print("✅ 모든 새 PDF 색인이 완료되었습니다.")
+    print("✅ 모든 새/수정된 PDF 색인이 완료되었습니다.")
+    store.print_write_summary()
+    queue.report()
+    timer.report()
+
+    ocr_total = extract_stats["ocr_cache_hits"] + extract_stats["ocr_cache_misses"]
+    if ocr_total:
+        hit_rate = extract_stats["ocr_cache_hits"] / ocr_total * 100
+        print(
+            f"🔁 OCR 캐시: 적중 {extract_stats['ocr_cache_hits']} / "
+            f"미스 {extract_stats['ocr_cache_misses']} (적중률 {hit_rate:.1f}%)"
+        )
+    if ocr_mode == "auto":
+        print(
+            f"🧮 OCR 생략 이미지 {extract_stats['ocr_images_skipped']}개, "
+            f"페이지 렌더링 OCR {extract_stats['ocr_pages_rendered']}쪽"
+        )
     print("📊 총 문서 수:", store.count_documents())
 
+    # 서버 워커들이 메모리 맵으로 공유하는 임베딩 스냅샷 (CURRENT 교체로 무중단 반영)
+    export_embedding_snapshot(store.conn, DB_PATH)
+
+    # 문서가 바뀌었으므로 IVF 색인도 다시 만든다
+    if build_ann:
+        build_ann_index(store, nlist=nlist)
+
 
 # ------------------------------
-# 6. 실행부
+# 7. 실행부
 # ------------------------------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--force", action="store_true", help="모든 문서를 삭제 후 전체 재색인")
+    parser.add_argument("--ann", action="store_true", help="색인 후 IVF 근사 검색 색인(hibot_store.ivf.npz)도 생성")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF 클러스터 수 (기본: 4·√문서수)")
+    parser.add_argument("--normalize", action="store_true", help="임베딩을 정규화된 단위 벡터로 저장 (기존 데이터도 변환)")
+    parser.add_argument("--workers", type=int, default=1, help="PDF 추출/OCR 워커 프로세스 수 (기본 1: 순차 처리)")
+    parser.add_argument(
+        "--ocr-mode", choices=["all", "auto"], default="all",
+        help="all: 모든 이미지 OCR (기본) / auto: 텍스트 밀도·이미지 면적으로 스캔 페이지·큰 이미지만 OCR",
+    )
+    parser.add_argument("--ocr-dpi", type=int, default=0, help="auto 모드에서 스캔 페이지를 이 DPI로 렌더링해 한 번에 OCR (0: 이미지별 OCR)")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE, help="한 번에 임베딩할 청크 수 (여러 파일의 청크를 모아서 채움)")
+    parser.add_argument("--embed-threads", type=int, default=None, help="임베딩 CPU 스레드 수 (기본: 라이브러리 기본값)")
+    parser.add_argument("--embed-backend", choices=["torch", "onnx", "openvino"], default="torch", help="임베딩 모델 실행 백엔드")
+    parser.add_argument("--embed-model-file", default=None, help="onnx/openvino 모델 파일 (예: onnx/model_qint8_avx2.onnx 양자화 모델)")
     args = parser.parse_args()
 
-    main(force_rebuild=args.force)
+    main(
+        force_rebuild=args.force,
+        build_ann=args.ann,
+        nlist=args.nlist,
+        normalize=args.normalize,
+        workers=args.workers,
+        ocr_mode=args.ocr_mode,
+        ocr_dpi=args.ocr_dpi,
+        embed_batch_size=args.embed_batch_size,
+        embed_threads=args.embed_threads,
+        embed_backend=args.embed_backend,
+        embed_model_file=args.embed_model_file,
+    )
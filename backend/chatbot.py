@@ -1,18 +1,43 @@
 import os
 import duckdb
 import json
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from haystack.components.embedders import SentenceTransformersTextEmbedder
 from haystack.components.builders import PromptBuilder
 from haystack.dataclasses import Document
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+
+from answer_cache import SemanticAnswerCache
+from context_packer import estimate_tokens, pack_context
+from embedding_cache import CachedTextEmbedder
+from gemini_client import GeminiClient, GeminiUnavailable
+from faq_registry import FaqRegistry
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, CallbackMetric, RequestTrace, span
+from reranker import CrossEncoderReranker
+from ann_index import IVFFlatIndex, ivf_index_path, top_k_indices
+from vector_store import (
+    MetaFilter,
+    embedding_snapshot_pointer,
+    filters_to_sql,
+    load_document_texts,
+    load_embedding_matrix,
+    load_embedding_snapshot,
+    meta_filter_table,
+)
 
 text_embedder = None
 retriever = None
+reranker = None  # HIBOT_RERANK_MODEL을 지정했을 때만 (initialize_chatbot에서 준비)
 prompt_builder = None
 
 # 동의어 파일 경로 
@@ -44,22 +69,12 @@ app.add_middleware(
 # 기획안의 "Quick Reply" 및 "FAQ 자동 응답"용
 # 키(Keyword)가 질문에 포함되어 있으면, AI(RAG)를 호출하지 않고 즉시 이 답변을 반환합니다.
 # (키워드를 구체적으로 적을수록 좋습니다)
-# --- 1. 순서 기반 FAQ 리스트로 변경 ---
-FIXED_FAQ_DATABASE = [
-    "[인사근태(확장)] → [시간외근무] → [시간외근무 신청관리] 메뉴에서 신청 가능합니다. 1일 최대 3시간 30분, 월 최대 15시간까지 신청 가능하며, 휴게시간 30분을 제외해 입력해야 합니다.",
-    "급여 담당자 이메일로 가족수당 신청서와 증빙서류(가족관계증명서, 건강보험 자격확인서 등)를 제출하면 됩니다. 배우자 4만원, 직계존속·비속 각 3만원이 지급됩니다. ※ 관련근거: 보수규정 시행규칙 별표 제1호",
-    "정규직·계약직 직원에게 연간 1,000,000포인트(1P=1원)가 부여되며, 단체보험료 공제 후 잔액 한도 내에서 사용 가능합니다. 입·퇴사자는 근무기간에 따라 월할 계산 적용됩니다.",
-    "출장신청은 [인사근태(확장)] → [근태신청서] → [출장신청] 메뉴에서 가능합니다. 국내출장은 1주일 이내, 국외출장은 2주일 이내에 운임·숙박비 등 증빙서류를 첨부하여 정산해야 합니다.",
-    "전산기기 및 사무기기(PC, 복합기, 세단기 등)는 기기 중간 또는 하단에 부착된 수리기사 연락처로 직접 유선 문의하시면 됩니다. 기타 시설물(조명, 의자, 문손잡이 등) 고장은 경영지원부 물품관리 담당자에게 연락해 주시기 바랍니다."
-]
-
-FAQ_KEYWORDS = [
-    ["시간외근무", "시간 외 근무", "연장근무"],
-    ["가족수당", "가족 수당"],
-    ["복지포인트", "복지 포인트"],
-    ["출장", "여비정산", "정산"],
-    ["전산장비", "PC", "프린터", "시설물", "고장"]
-]
+# FAQ 목록은 faq.json에서 관리 (순서 = /api/faq 번호, 파일을 고치면 재시작 없이 반영)
+FAQ_PATH = "faq.json"
+
+# 벡터 FAQ: 키워드가 없어도 FAQ 예시 문장과 이 유사도 이상으로 비슷한 질문이면 FAQ 답변으로 응답
+FAQ_VECTOR_MATCH = os.getenv("HIBOT_FAQ_VECTOR", "true").lower() == "true"
+FAQ_VECTOR_THRESHOLD = float(os.getenv("HIBOT_FAQ_THRESHOLD", "0.85"))
 
 
 # --- 2. 경로 및 모델 설정 ---
@@ -67,16 +82,104 @@ FAQ_KEYWORDS = [
 EMBEDDING_MODEL = "jhgan/ko-sbert-nli"  # 한국어 모델 (SSL 문제 해결 후 사용)
 DB_PATH = "hibot_store.db"  # build_index.py와 동일한 DuckDB 파일 경로
 
-# 동의어 맵 로드 함수
-def load_synonym_map():
-    try:
-        with open(SYNONYM_MAP_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"⚠️ synonym_map.json 불러오기 실패: {e}")
-        return {}
+# 검색 방식: "exact"(전수 비교) 또는 "ivf"(build_index.py --ann 으로 만든 근사 색인)
+# IVF_NPROBE: 검색할 클러스터 수 (클수록 정확, 작을수록 빠름 → eval_ann.py로 확인)
+RETRIEVER_INDEX = os.getenv("HIBOT_RETRIEVER_INDEX", "exact")
+IVF_NPROBE = int(os.getenv("HIBOT_IVF_NPROBE", "8"))
+
+# 검색 모드: "hybrid"(BM25 바이그램 + 벡터, RRF로 합침) 또는 "vector"(벡터만)
+# LEXICAL_CANDIDATES: 각 방식에서 합치기 전에 가져오는 후보 수
+# LEXICAL_PREFILTER : 어휘 후보가 충분하면 그 안에서만 벡터 점수를 계산 (행렬 전체를 훑지 않음)
+RETRIEVER_MODE = os.getenv("HIBOT_RETRIEVER_MODE", "hybrid")
+LEXICAL_CANDIDATES = int(os.getenv("HIBOT_LEXICAL_CANDIDATES", "100"))
+LEXICAL_PREFILTER = os.getenv("HIBOT_LEXICAL_PREFILTER", "true").lower() == "true"
+
+# build_index.py가 내보낸 hibot_store.vectors/ 스냅샷을 메모리 맵으로 열지 여부
+# (uvicorn --workers N 이어도 임베딩 행렬은 페이지 캐시의 한 벌만 쓴다, 없으면 DB에서 읽음)
+USE_EMBEDDING_SNAPSHOT = os.getenv("HIBOT_EMBEDDING_SNAPSHOT", "true").lower() == "true"
+
+# /api/chat 동시 처리 설정
+# RAG_WORKERS     : 질문 임베딩 + 검색을 돌리는 스레드 수 (이벤트 루프를 막지 않도록 분리)
+# RAG_MAX_INFLIGHT: 동시에 처리하는 RAG 요청 수 (넘치면 기다리게 하지 않고 바로 "혼잡" 응답)
+RAG_WORKERS = int(os.getenv("HIBOT_RAG_WORKERS", "2"))
+RAG_MAX_INFLIGHT = int(os.getenv("HIBOT_RAG_MAX_INFLIGHT", "8"))
+BUSY_MESSAGE = "⚠️ 지금 질문이 많아 답변이 어렵습니다. 잠시 후 다시 시도해주세요."
+
+# 반복 질문 답변 캐시 (같은 질문 / 임베딩이 threshold 이상 비슷한 질문 → Gemini 호출 생략)
+ANSWER_CACHE_SIZE = int(os.getenv("HIBOT_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("HIBOT_ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("HIBOT_ANSWER_CACHE_THRESHOLD", "0.93"))
+answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL,
+    threshold=ANSWER_CACHE_THRESHOLD,
+)
+
+# 시작 방식
+# STARTUP_MODE: "background"(서버는 바로 뜨고 모델/행렬은 뒤에서 적재, /readyz로 준비 여부 확인)
+#               "blocking"(예전처럼 적재가 끝나야 요청을 받음)
+# MODEL_PATH  : 미리 받아둔 임베딩 모델 폴더 (이미지에 넣어두면 시작 때 다운로드/네트워크 확인 없음)
+# MODEL_LOCAL_ONLY: HF 캐시에 있는 모델만 사용 (허브에 버전 확인 요청을 보내지 않음)
+STARTUP_MODE = os.getenv("HIBOT_STARTUP_MODE", "background")
+MODEL_PATH = os.getenv("HIBOT_MODEL_PATH")
+MODEL_LOCAL_ONLY = bool(MODEL_PATH) or os.getenv("HIBOT_MODEL_LOCAL_ONLY", "false").lower() == "true"
+NOT_READY_MESSAGE = "⏳ 챗봇을 준비하고 있습니다. 잠시 후 다시 시도해주세요."
+
+# 프롬프트에 넣을 문서 문맥의 토큰 예산 (이웃 청크 합치기 + 관련 문장 위주로 채움)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("HIBOT_CONTEXT_TOKENS", "1500"))
+
+# 크로스 인코더 재순위 (HIBOT_RERANK_MODEL을 지정했을 때만)
+# 예: cross-encoder/mmarco-mMiniLMv2-L12-H384-v1 (다국어, CPU용 소형)
+# CANDIDATES: 리트리버에서 받아 다시 채점할 후보 수 (= 상한), TOP_K: 남길 문서 수
+# THRESHOLD : 이 점수(0~1) 미만은 버림 - 남는 문서가 없으면 Gemini를 부르지 않는다
+# TIMEOUT   : 이 시간(초) 안에 못 끝내면 검색 순서 그대로 사용
+RERANK_MODEL = os.getenv("HIBOT_RERANK_MODEL")
+RERANK_CANDIDATES = int(os.getenv("HIBOT_RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("HIBOT_RERANK_TOP_K", "4"))
+RERANK_THRESHOLD = float(os.getenv("HIBOT_RERANK_THRESHOLD", "0.2"))
+RERANK_TIMEOUT = float(os.getenv("HIBOT_RERANK_TIMEOUT", "1.5"))
+
+# 질문 임베딩 캐시 크기 (정규화한 질문 문자열 → 임베딩)
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("HIBOT_QUERY_EMBED_CACHE_SIZE", "1024"))
+
+# Gemini 호출 설정 (gemini_client.py)
+# RPS/BURST: 초당 호출 수 제한, RETRIES: 429/5xx/타임아웃 재시도 횟수, TIMEOUT: 요청/조각 대기 시간(초)
+# HEDGE_DELAY: 토큰을 받은 뒤 이 시간(초) 안에 첫 응답이 없으면 같은 요청을 하나 더 보냄 (남은 토큰이 없으면 안 보냄, 비우면 사용 안 함)
+# BREAKER_*: 연속 실패 횟수 / 호출 중단 시간(초) - 중단 중에는 검색된 문서를 그대로 보여준다
+GEMINI_MODEL = os.getenv("HIBOT_GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_RPS = float(os.getenv("HIBOT_GEMINI_RPS", "2"))
+GEMINI_BURST = int(os.getenv("HIBOT_GEMINI_BURST", "5"))
+GEMINI_RETRIES = int(os.getenv("HIBOT_GEMINI_RETRIES", "3"))
+GEMINI_TIMEOUT = float(os.getenv("HIBOT_GEMINI_TIMEOUT", "30"))
+GEMINI_HEDGE_DELAY = float(os.getenv("HIBOT_GEMINI_HEDGE_DELAY")) if os.getenv("HIBOT_GEMINI_HEDGE_DELAY") else None
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("HIBOT_GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("HIBOT_GEMINI_BREAKER_COOLDOWN", "30"))
+# 테스트용 로컬 스텁 서버 주소 (예: localhost:8090)
+GEMINI_ENDPOINT = os.getenv("HIBOT_GEMINI_ENDPOINT")
+
+# 이 시간(ms)보다 오래 걸린 요청은 단계별 소요 시간을 로그로 남김 (0이면 끔, 단계별 히스토그램은 /metrics)
+SLOW_REQUEST_SECONDS = float(os.getenv("HIBOT_SLOW_REQUEST_MS", "0")) / 1000
+
+# Gemini에 보내는 프롬프트 (pack_context로 압축한 문서 + 질문)
+PROMPT_TEMPLATE = """
+넌 제공된 [문서] 내용을 바탕으로 답변하는 챗봇이다.
+오직 [문서]에 있는 내용만을 근거로 [질문]에 대해 대답해.
+[문서]에 관련 내용이 없다면, "죄송합니다. 관련 내용을 학습하지 않았습니다."라고 답변해.
+
+[문서 요약된 내용]:
+{% for doc in documents %}
+[문서 {{ loop.index }}]
+{{ doc.content }}
+
+{% endfor %}
+
+[질문]: {{ question }}
+
+[답변]:
+"""
 
-SYNONYM_MAP = load_synonym_map()
+# FAQ + 동의어 + 키워드 매처 (faq.json / synonym_map.json이 바뀌면 다음 요청 때 통째로 교체)
+faq_registry = FaqRegistry(FAQ_PATH, SYNONYM_MAP_PATH, threshold=FAQ_VECTOR_THRESHOLD)
 
 # 긴 문서를 문장 단위로 자르는 함수
 def smart_trim(text, max_length=600):
@@ -113,114 +216,343 @@ def smart_trim(text, max_length=600):
 
 
 # --- 3. Custom DuckDB Retriever Class ---
+# 한 번에 적재된 검색 상태 (ids / metas / matrix 는 같은 행 순서를 공유)
+# 재색인 시 통째로 교체되므로, 검색 도중 다른 스레드가 다시 읽어도 섞이지 않는다.
+# texts: 같은 행 순서의 본문 (메모리 맵 스냅샷 또는 DB에서 한 번에 읽은 목록)
+# meta_filter: 같은 행 순서의 메타 컬럼 (필터 → 행 번호)
+RetrieverSnapshot = namedtuple(
+    "RetrieverSnapshot", ["ids", "metas", "matrix", "ann_index", "lexical_index", "texts", "meta_filter"]
+)
+
+
 class DuckDBEmbeddingRetriever:
-    """DuckDB에서 유사한 문서를 검색하는 커스텀 리트리버"""
+    """DuckDB에서 유사한 문서를 검색하는 커스텀 리트리버
+
+    모든 임베딩을 한 번만 읽어서 정규화된 float32 행렬로 메모리에 올려두고,
+    질문마다 행렬-벡터 곱 한 번으로 코사인 유사도를 계산한다.
+    DB 파일이 바뀌면(재색인) 다음 검색 때 자동으로 다시 읽어온다.
+    DuckDB는 적재할 때만 읽기 전용으로 열었다가 바로 닫는다.
+    → 연결을 잡고 있으면 파일 잠금 때문에 build_index.py가 DB에 쓸 수 없다.
+    (트레이드오프) 그래서 DB에서 적재하면 상위 문서만이 아니라 모든 청크의 본문을 이 프로세스 메모리에 올린다.
+    검색마다 연결을 열어 상위 문서 본문만 읽으면, 색인 중(쓰기 잠금)에는 검색이 실패하기 때문.
+    스냅샷(use_snapshot=True, 기본)을 쓰면 본문은 메모리 맵이라 상위 문서 본문만 실제로 읽힌다.
+
+    index_type="ivf"이면 DB 옆의 IVF 색인에서 nprobe개 클러스터만 비교한다.
+    (색인 파일이 없거나 DB와 맞지 않으면 전수 비교로 대체)
+
+    mode="hybrid"이면 본문 BM25(글자 바이그램) 순위와 벡터 순위를 RRF로 합친다.
+    짧은 키워드 질문("시간외근무")처럼 임베딩만으로는 엉뚱한 청크가 걸리는 경우를 보완.
+    prefilter=True이고 어휘 후보가 candidates개 이상이면 그 후보 안에서만 벡터 점수를 계산한다.
+
+    use_snapshot=True이면 build_index.py가 내보낸 스냅샷(임베딩 / 본문 / meta / BM25 색인 / 필터용 메타 컬럼)을
+    읽기 전용 메모리 맵으로 연다. 여러 워커 프로세스가 같은 파일을 매핑하므로 이들은 물리 메모리에 한 벌만 올라가고,
+    색인 도중(DB 쓰기 잠금 중)에도 DB를 열 필요가 없다.
+    재색인으로 CURRENT가 바뀌면 다음 검색 때 새 버전을 다시 매핑한다.
+
+    run(filters=...)에 Haystack 2 필터를 주면 메타 컬럼(규정 이름 / 부서 / 시행일 / 현행 여부 …)으로
+    먼저 행을 고르고, 그 행들에 대해서만 벡터/BM25 점수를 계산한다 (IVF 색인은 쓰지 않음).
+
+    여러 스레드에서 동시에 run()을 호출해도 된다.
+    """
     # top_k: ai에 보낼 문서 개수
-    def __init__(self, db_path, top_k=6):
+    def __init__(self, db_path, top_k=6, index_type="exact", nprobe=8,
+                 mode="vector", candidates=100, prefilter=True, use_snapshot=False):
         self.db_path = db_path
         self.top_k = top_k
-        self.conn = None
-        
-    def connect(self):
-        """DuckDB 연결"""
-        if self.conn is None:
-            self.conn = duckdb.connect(self.db_path)
-    
-    def run(self, query_embedding):
-        """쿼리 임베딩과 유사한 문서들을 검색"""
-        self.connect()
-        
-        # 모든 문서와 임베딩을 가져옴
-        docs_data = self.conn.execute("""
-            SELECT id, content, meta, embedding 
-            FROM documents 
-            WHERE embedding IS NOT NULL
-        """).fetchall()
-        
-        if not docs_data:
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.mode = mode
+        self.candidates = candidates
+        self.prefilter = prefilter
+        self.use_snapshot = use_snapshot
+
+        # 메모리 색인 (재색인 시 snapshot 전체를 한 번에 교체)
+        self.snapshot = RetrieverSnapshot(
+            ids=np.empty(0, dtype=object),
+            metas=[],
+            matrix=np.empty((0, 0), dtype=np.float32),
+            ann_index=None,
+            lexical_index=None,
+            texts=None,
+            meta_filter=None,
+        )
+        self._db_signature = None
+        # 다시 읽기(snapshot 교체)를 직렬화
+        self._lock = threading.Lock()
+
+    @property
+    def corpus_version(self):
+        """현재 적재된 DB 버전 (재색인되면 바뀐다 - 답변 캐시 무효화용)"""
+        return self._db_signature
+
+    def _db_file_signature(self):
+        """DB 파일(+ WAL, IVF 색인)의 수정시각/크기 → 재색인 여부 판단용
+
+        스냅샷을 쓰면 CURRENT 파일만 본다 (색인 도중 DB가 계속 바뀌어도 다시 읽지 않는다).
+        """
+        pointer = embedding_snapshot_pointer(self.db_path)
+        if self.use_snapshot and os.path.exists(pointer):
+            paths = [pointer]
+        else:
+            paths = [self.db_path, self.db_path + ".wal"]
+        if self.index_type == "ivf":
+            paths.append(ivf_index_path(self.db_path))
+
+        signature = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load_matrix(self):
+        """documents 테이블의 임베딩을 정규화된 float32 행렬로 적재"""
+        loaded = self._load_snapshot() if self.use_snapshot else None
+        if loaded is None:
+            # 적재하는 동안만 연결 (재색인된 파일을 보려면 어차피 새로 열어야 한다)
+            # 본문은 모든 행을 읽어 둔다: 검색 때 DB를 다시 열지 않기 위한 메모리 트레이드오프 (클래스 설명 참고)
+            with duckdb.connect(self.db_path, read_only=True) as conn:
+                ids, metas, matrix = load_embedding_matrix(conn)
+                texts = load_document_texts(conn)
+            lexical_index = meta_table = None
+            print(f"📥 임베딩 행렬 적재 완료: {matrix.shape[0]}개 문서")
+        else:
+            # BM25 색인 / 메타 컬럼도 스냅샷에 들어 있어 워커마다 새로 만들지 않는다
+            _, ids, metas, matrix, texts, lexical_index, meta_table = loaded
+
+        ann_index = self._load_ann_index(ids) if self.index_type == "ivf" else None
+
+        if self.mode != "hybrid":
+            lexical_index = None
+        elif lexical_index is None:
+            start = time.perf_counter()
+            lexical_index = BM25Index.build(texts)
+            print(f"🔤 어휘(BM25) 색인 생성: 단어 {len(lexical_index.terms)}개, {time.perf_counter() - start:.2f}s")
+
+        meta_filter = MetaFilter(meta_table if meta_table is not None else meta_filter_table(ids, metas))
+        self.snapshot = RetrieverSnapshot(ids, metas, matrix, ann_index, lexical_index, texts, meta_filter)
+
+    def _load_snapshot(self):
+        """메모리 맵 스냅샷 열기 (없거나 깨졌으면 None → DB에서 읽는다)"""
+        try:
+            loaded = load_embedding_snapshot(self.db_path)
+        except Exception as e:
+            print(f"⚠️ 임베딩 스냅샷 로드 실패 → DB에서 읽습니다: {e}")
+            return None
+        if loaded is None:
+            print("⚠️ 임베딩 스냅샷이 없습니다 (build_index.py 재실행 시 생성) → DB에서 읽습니다")
+            return None
+
+        print(f"🗺️ 임베딩 스냅샷 매핑 완료: {len(loaded.ids)}개 문서 ({loaded.version})")
+        return loaded
+
+    def _load_ann_index(self, ids):
+        """IVF 색인 로드 (DB의 문서 id 순서와 같을 때만 사용)"""
+        path = ivf_index_path(self.db_path)
+        if not os.path.exists(path):
+            print(f"⚠️ IVF 색인 파일이 없습니다 → 전수 비교로 검색합니다: {path}")
+            return None
+        try:
+            index = IVFFlatIndex.load(path)
+        except Exception as e:
+            print(f"⚠️ IVF 색인 로드 실패 → 전수 비교로 검색합니다: {e}")
+            return None
+
+        if not np.array_equal(index.ids, ids):
+            print("⚠️ IVF 색인이 현재 DB와 맞지 않습니다 (build_index.py --ann 재실행 필요) → 전수 비교로 검색합니다")
+            return None
+
+        print(f"🧭 IVF 색인 사용: nlist={index.nlist}, nprobe={self.nprobe}")
+        return index
+
+    def refresh(self):
+        """DB 파일이 바뀌었으면 임베딩 행렬을 다시 읽는다
+
+        이미 적재한 상태에서 다시 읽기에 실패하면(예: build_index.py가 쓰는 중이라 DB가 잠김)
+        이전 snapshot으로 계속 검색하고 다음 검색 때 다시 시도한다.
+        """
+        signature = self._db_file_signature()
+        if signature == self._db_signature:
+            return
+        with self._lock:
+            if signature == self._db_signature:
+                return
+            try:
+                self._load_matrix()
+            except Exception as e:
+                if self._db_signature is None:
+                    raise
+                print(f"⚠️ 재색인된 DB 다시 읽기 실패 → 이전 색인으로 검색합니다: {e}")
+                return
+            self._db_signature = signature
+
+    def _dense_search(self, snapshot, query_emb, k, rows=None):
+        """snapshot 안에서 벡터 유사도 상위 k개 행 번호와 점수를 구한다 (rows: 필터로 고른 행만)"""
+        if rows is not None:
+            scores = snapshot.matrix[rows] @ query_emb
+            top = top_k_indices(scores, k)
+            return rows[top], scores[top]
+
+        if snapshot.ann_index is not None:
+            # 가까운 클러스터만 비교 (근사 검색)
+            return snapshot.ann_index.search(snapshot.matrix, query_emb, k, self.nprobe)
+
+        # 코사인 유사도 = 정규화된 행렬 @ 정규화된 쿼리
+        # 전체 정렬 대신 argpartition으로 top_k만 고른 뒤 그 안에서만 정렬
+        scores = snapshot.matrix @ query_emb
+        top_idx = top_k_indices(scores, k)
+        return top_idx, scores[top_idx]
+
+    def _search(self, snapshot, query_emb, query, k, rows=None):
+        """상위 k개 행 번호와 점수 (hybrid면 점수는 RRF 점수)"""
+        if snapshot.lexical_index is None or not query:
+            return self._dense_search(snapshot, query_emb, k, rows)
+
+        candidates = max(self.candidates, k)
+        lexical_rows, _ = snapshot.lexical_index.search(query, candidates, rows)
+        if self.prefilter and len(lexical_rows) >= candidates:
+            # 어휘 후보 안에서만 벡터 점수 계산
+            scores = snapshot.matrix[lexical_rows] @ query_emb
+            dense_rows = lexical_rows[top_k_indices(scores, candidates)]
+        else:
+            dense_rows, _ = self._dense_search(snapshot, query_emb, candidates, rows)
+
+        return reciprocal_rank_fusion([lexical_rows, dense_rows], k)
+
+    def run(self, query_embedding, query=None, top_k=None, filters=None):
+        """쿼리 임베딩(+ hybrid면 질문 문장)과 유사한 문서들을 검색
+
+        top_k: 이번 검색에서만 가져올 개수 (재순위용으로 후보를 넉넉히 받을 때)
+        filters: Haystack 2 필터 (예: {"field": "meta.doc_title", "operator": "==", "value": "보수규정"})
+                 잘못된 필터는 ValueError
+        """
+        k = top_k or self.top_k
+        # 쿼리 벡터는 한 번만 정규화 (query_embedding is a list)
+        query_emb = np.asarray(query_embedding[0], dtype=np.float32)
+        query_norm = np.linalg.norm(query_emb)
+        if query_norm == 0:
             return {"documents": []}
-        
-        # 코사인 유사도 계산
-        similarities = []
-        for doc_id, content, meta_str, embedding in docs_data:
-            if embedding:
-                # 코사인 유사도 계산
-                doc_embedding = np.array(embedding)
-                query_emb = np.array(query_embedding[0])  # query_embedding is a list
-                
-                similarity = np.dot(query_emb, doc_embedding) / (
-                    np.linalg.norm(query_emb) * np.linalg.norm(doc_embedding)
-                )
-                
-                try:
-                    meta = json.loads(meta_str) if meta_str else {}
-                except:
-                    meta = {}
-                
-                similarities.append((similarity, doc_id, content, meta))
-        
-        # 유사도 순으로 정렬하고 top_k만 선택
-        similarities.sort(reverse=True, key=lambda x: x[0])
-        top_docs = similarities[:self.top_k]
-        
+        query_emb = query_emb / query_norm
+
+        # 검색 도중 재색인돼도 이 snapshot(행렬 + 본문)은 그대로라 결과가 섞이지 않는다
+        self.refresh()
+        snapshot = self.snapshot
+        if snapshot.matrix.shape[0] == 0:
+            return {"documents": []}
+
+        rows = snapshot.meta_filter.rows(filters) if filters else None
+        if rows is not None and len(rows) == 0:
+            return {"documents": []}
+
+        top_idx, top_scores = self._search(snapshot, query_emb, query, k, rows)
+
         # Document 객체 생성
         documents = []
-        for similarity, doc_id, content, meta in top_docs:
-            doc = Document(id=doc_id, content=content, meta=meta)
+        for i, score in zip(top_idx, top_scores):
+            doc = Document(
+                id=snapshot.ids[i],
+                content=snapshot.texts[i],
+                meta=dict(snapshot.metas[i]),
+                score=float(score),
+            )
             documents.append(doc)
-        
+
         return {"documents": documents}
-    
 
-def find_representative_keyword(question: str):
-    """
-    사용자의 질문에 SYNONYM_MAP의 동의어가 포함되어 있으면 
-    대표 키워드를 반환하는 함수
-    예: '야근 신청 어떻게?' → '시간외근무'
-    """
-    for rep_keyword, synonyms in SYNONYM_MAP.items():
-        # 대표 단어 자체가 질문에 있는 경우
-        if rep_keyword in question:
-            return rep_keyword
-        
-        # 동의어들이 질문 안에 포함되어 있는지
-        for syn in synonyms:
-            if syn in question:
-                return rep_keyword
 
-    return None
+def match_keywords(question):
+    """FAQ 답변과 동의어 대표 키워드를 한 번에 찾는다
+
+    반환: (faq_answer, rep_keyword) - FAQ 키워드가 있으면 FAQ가 우선, 없으면 둘 다 None
+    """
+    match = faq_registry.match(question)
+    return match.answer, match.rep_keyword
 
 
 
 # --- 4. [신규] RAG 파이프라인 "라우터" (Req 3) ---
 
-def initialize_chatbot():
+def create_reranker():
+    """HIBOT_RERANK_MODEL이 있으면 크로스 인코더 재순위기 준비 (없거나 실패하면 None → 재순위 없이 검색)"""
+    if not RERANK_MODEL:
+        return None
+    try:
+        rerank = CrossEncoderReranker(
+            RERANK_MODEL,
+            top_k=RERANK_TOP_K,
+            candidates=RERANK_CANDIDATES,
+            threshold=RERANK_THRESHOLD,
+            timeout=RERANK_TIMEOUT,
+        )
+        rerank.warm_up()
+    except Exception as e:
+        print(f"⚠️ 재순위 모델 로드 실패 → 재순위 없이 검색합니다: {e}")
+        return None
+    print(f"✅ 재순위 모델 준비: {RERANK_MODEL} (후보 {RERANK_CANDIDATES}개 → 최대 {RERANK_TOP_K}개, 기준 {RERANK_THRESHOLD})")
+    return rerank
+
+
+def initialize_chatbot(timings=None):
+    """임베더 / 리트리버 / 프롬프트 빌더 (+ 재순위기) 준비 (timings에 단계별 소요 시간(초)을 기록)"""
+    global reranker
     print("챗봇 초기화 중...")
-    
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round(now - started, 3)
+        started = now
+
     # (A) DuckDB 연결 확인
     try:
         if not os.path.exists(DB_PATH):
             print(f"❌ '{DB_PATH}' 데이터베이스 파일을 찾을 수 없습니다.")
             print("먼저 'python build_index.py' 스크립트를 실행하여 문서를 색인해주세요.")
             return None
-        
-        conn = duckdb.connect(DB_PATH)
-        doc_count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
-        conn.close()
-        print(f"✅ '{DB_PATH}'에서 {doc_count}개 문서를 확인했습니다.")
+
+        if USE_EMBEDDING_SNAPSHOT and os.path.exists(embedding_snapshot_pointer(DB_PATH)):
+            # 스냅샷으로 검색하면 DB는 열지 않는다 (build_index.py가 쓰는 중이면 잠겨 있어 시작이 실패한다)
+            print(f"✅ '{DB_PATH}'의 임베딩 스냅샷을 사용합니다 (문서 수는 리트리버 적재 시 표시).")
+        else:
+            with duckdb.connect(DB_PATH, read_only=True) as conn:
+                doc_count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            print(f"✅ '{DB_PATH}'에서 {doc_count}개 문서를 확인했습니다.")
     except Exception as e:
         print(f"❌ '{DB_PATH}' 데이터베이스 연결 실패: {e}")
         print("먼저 'python build_index.py' 스크립트를 실행하여 문서를 색인해주세요.")
         return None
+    lap("db_check")
 
     # (B) RAG 파이프라인 준비 (SSL 오류 처리 포함)
     try:
+        # torch / sentence-transformers는 무거워서 여기서 import (서버 프로세스는 먼저 뜬다)
+        from haystack.components.embedders import SentenceTransformersTextEmbedder
+        lap("import_embedder")
+
         # 한국어 문장을 숫자 벡터로 자동 변환해주는 모델을 로딩 
-        text_embedder = SentenceTransformersTextEmbedder(model=EMBEDDING_MODEL)
+        # (MODEL_PATH / MODEL_LOCAL_ONLY면 허브에 접속하지 않고 로컬 파일만 사용)
+        text_embedder = SentenceTransformersTextEmbedder(
+            model=MODEL_PATH or EMBEDDING_MODEL,
+            local_files_only=MODEL_LOCAL_ONLY,
+            progress_bar=False,
+        )
         # 임베딩 기반 검색기(semantic search engine)
         # DuckDB 파일(hibot_store.db)에 접속해서 문서들의 임베딩(vector) 목록을 읽고 
         # 질문의  임베딩과 코사인 유사도(similarity score)를 계산해서 가장 비슷한 문서 **12(top_k=12)**를 반환함
-        retriever = DuckDBEmbeddingRetriever(db_path=DB_PATH, top_k=6)
+        retriever = DuckDBEmbeddingRetriever(
+            db_path=DB_PATH, top_k=6, index_type=RETRIEVER_INDEX, nprobe=IVF_NPROBE,
+            mode=RETRIEVER_MODE, candidates=LEXICAL_CANDIDATES, prefilter=LEXICAL_PREFILTER,
+            use_snapshot=USE_EMBEDDING_SNAPSHOT,
+        )
+        # 임베딩 행렬은 모델을 읽는 동안 다른 스레드에서 미리 메모리에 올려둔다 (첫 질문 지연 방지)
+        preload_started = time.perf_counter()
+        preload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload")
+        preload = preload_executor.submit(retriever.refresh)
+        preload_executor.shutdown(wait=False)
         print("✅ 임베더와 리트리버 초기화 완료")
     except Exception as e:
         print(f"❌ 임베더 초기화 실패: {e}")
@@ -229,60 +561,196 @@ def initialize_chatbot():
         print("   2. 인터넷 연결 확인")
         return None
     
-    prompt_template = """
-넌 제공된 [문서] 내용을 바탕으로 답변하는 챗봇이다.
-오직 [문서]에 있는 내용만을 근거로 [질문]에 대해 대답해.
-[문서]에 관련 내용이 없다면, "죄송합니다. 관련 내용을 학습하지 않았습니다."라고 답변해.
-
-[문서 요약된 내용]:
-{% for doc in documents %}
-[문서 {{ loop.index }}]
-{{ doc.content }}
-
-{% endfor %}
-
-[질문]: {{ question }}
-
-[답변]:
-"""
-    prompt_builder = PromptBuilder(template=prompt_template, required_variables=["documents", "question"])
+    prompt_builder = PromptBuilder(template=PROMPT_TEMPLATE, required_variables=["documents", "question"])
     
     # (C) 임베더 초기화 (SSL 오류 처리)
     try:
         # 임베더 초기화 (SSL 오류 처리)
         text_embedder.warm_up()
+        lap("model_load")
+
+        # 질문 임베딩 캐시 + 대표 키워드 / FAQ 키워드 미리 계산
+        text_embedder = CachedTextEmbedder(text_embedder, max_entries=QUERY_EMBED_CACHE_SIZE)
+        warmed = text_embedder.preload(faq_registry.warm_texts())
+        print(f"✅ 질문 임베딩 캐시 예열: {warmed}개")
+        lap("query_cache_warm")
+
+        # 벡터 FAQ용 FAQ 문장 임베딩 (faq.json이 바뀌면 다음 요청 때 바뀐 문장만 새로 계산)
+        if FAQ_VECTOR_MATCH:
+            faq_registry.attach_embedder(text_embedder)
+            lap("faq_embed")
+
+        # (선택) 재순위 모델도 행렬 적재와 겹쳐서 올린다
+        reranker = create_reranker()
+        if reranker is not None:
+            lap("reranker_load")
+
+        # 행렬 적재가 끝날 때까지 대기 (모델 적재와 겹쳐서 진행됨)
+        preload.result()
+        timings["matrix_preload"] = round(time.perf_counter() - preload_started, 3)
         print("✅ 챗봇 RAG 파이프라인 준비 완료.")
         return text_embedder, retriever, prompt_builder
     except Exception as e:
         print(f"❌ 파이프라인 초기화 실패: {e}")
         return None
 
-def create_gemini_response(prompt):
-    """Gemini API를 직접 사용하여 응답을 생성하는 함수 """
+def gemini_error_message(e):
+    """Gemini 호출 예외 → 사용자에게 보여줄 안내 문구"""
+    error_msg = str(e)
+
+    # 1) 무료 사용량(Quota) 초과 또는 Rate Limit 초과
+    if "429" in error_msg or "Resource exhausted" in error_msg:
+        return (
+            "⚠️ 현재 AI 무료 사용량 또는 호출 한도를 초과했습니다.\n"
+            " 잠시 후 다시 시도해주세요.\n"
+            "지속되면 관리자에게 문의해주세요."
+        )
+
+    # 2) API Key 문제
+    if "API key" in error_msg or "permission" in error_msg.lower():
+        return (
+            "⚠️ AI 서버 인증 오류가 발생했습니다."
+        )
+
+    # 3) 기타 오류
+    return f"Gemini API 호출 중 오류가 발생했습니다: {error_msg}"
+
+
+gemini_client = None
+_gemini_client_lock = threading.Lock()
+
+
+def get_gemini_client():
+    """서버 전체가 같이 쓰는 Gemini 클라이언트 (처음 쓸 때 한 번만 생성)"""
+    global gemini_client
+    if gemini_client is None:
+        with _gemini_client_lock:
+            if gemini_client is None:
+                gemini_client = GeminiClient(
+                    api_key=os.environ.get("GOOGLE_API_KEY"),
+                    model_name=GEMINI_MODEL,
+                    rate_per_sec=GEMINI_RPS,
+                    burst=GEMINI_BURST,
+                    max_retries=GEMINI_RETRIES,
+                    timeout=GEMINI_TIMEOUT,
+                    hedge_delay=GEMINI_HEDGE_DELAY,
+                    failure_threshold=GEMINI_BREAKER_THRESHOLD,
+                    cooldown=GEMINI_BREAKER_COOLDOWN,
+                    api_endpoint=GEMINI_ENDPOINT,
+                )
+    return gemini_client
+
+
+def call_gemini(prompt):
+    """Gemini 호출 (실패하면 예외 그대로 - 성공한 답변만 캐시하기 위해)"""
+    return get_gemini_client().generate(prompt)
+
+
+async def stream_gemini_async(prompt):
+    """Gemini 답변을 생성되는 대로 조각(text)씩 내보낸다 (/api/chat용 - 기다리는 동안 이벤트 루프를 막지 않음)"""
+    async for text in get_gemini_client().stream(prompt):
+        yield text
+
+
+def fallback_answer(docs, error):
+    """Gemini를 쓸 수 없을 때: 안내 문구 + 검색 상위 문서 내용을 그대로"""
+    if isinstance(error, GeminiUnavailable) and error.cause is None:
+        notice = "⚠️ AI 서버 응답이 원활하지 않아 관련 문서 내용을 그대로 보여드립니다."
+    else:
+        notice = gemini_error_message(getattr(error, "cause", None) or error)
+
+    excerpts = [f"[문서 {i}] {smart_trim(doc.content, 300)}" for i, doc in enumerate(docs[:2], start=1)]
+    return notice + "\n\n📚 질문과 가장 관련 있는 문서 내용:\n\n" + "\n\n".join(excerpts)
+
+
+def format_source(doc):
+    """검색 1순위 문서 → "파일명 p.3" / "파일명 p.3-4" 형식의 출처 문구"""
     try:
-        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
-        model = genai.GenerativeModel('gemini-2.0-flash')  # Updated to available model
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        error_msg = str(e)
-
-        # 1) 무료 사용량(Quota) 초과 또는 Rate Limit 초과
-        if "429" in error_msg or "Resource exhausted" in error_msg:
-            return (
-                "⚠️ 현재 AI 무료 사용량 또는 호출 한도를 초과했습니다.\n"
-                " 잠시 후 다시 시도해주세요.\n"
-                "지속되면 관리자에게 문의해주세요."
-            )
+        raw_name = doc.meta.get("file_name", "출처 정보 없음")
+        page = doc.meta.get("page_number", None)
+        page_end = doc.meta.get("page_end", None)
 
-        # 2) API Key 문제
-        if "API key" in error_msg or "permission" in error_msg.lower():
-            return (
-                "⚠️ AI 서버 인증 오류가 발생했습니다."
-            )
+        # .pdf 제거
+        if raw_name.lower().endswith(".pdf"):
+            clean_name = raw_name[:-4]
+        else:
+            clean_name = raw_name
+
+        # 페이지 번호 있으면 붙이기 (청크가 여러 페이지에 걸치면 범위로)
+        if page and page_end and page_end != page:
+            return f"{clean_name} p.{page}-{page_end}"
+        elif page:
+            return f"{clean_name} p.{page}"
+        return clean_name
+
+    except Exception:
+        return "알 수 없음"
+
+
+def build_prompt(prompt_builder, docs, question, trace=None, original_question=None):
+    """검색 문서를 토큰 예산 안으로 압축해 프롬프트를 만들고 토큰 수를 남긴다
+
+    문장/청크 관련도는 original_question(동의어 대표 키워드로 바꾸기 전 문장)으로 매긴다.
+    """
+    with span(trace, "prompt_build"):
+        packed_docs, context_tokens = pack_context(docs, original_question or question, CONTEXT_TOKEN_BUDGET)
+        prompt = prompt_builder.run(documents=packed_docs, question=question)["prompt"]
+    print(
+        f"🧾 프롬프트 토큰(추정): {estimate_tokens(prompt)} "
+        f"(문서 {len(docs)}개 → {len(packed_docs)}개, 문맥 {context_tokens}/{CONTEXT_TOKEN_BUDGET})"
+    )
+    return prompt
+
+
+def lookup_or_retrieve(question, text_embedder, retriever, trace=None, filters=None, original_question=None):
+    """답변 캐시(같은 질문) → 질문 임베딩 → 답변 캐시(비슷한 질문) → 문서 검색
+
+    반환: (cached, query_emb, docs) - 캐시 hit이면 cached가 있고 docs는 빈 리스트
+    질문이 FAQ 예시 문장과 충분히 비슷하면 cached = {"answer": FAQ 답변, "source": None, "faq": 번호}
+    original_question: 동의어 대표 키워드로 바꾸기 전 문장 - FAQ 비교와 재순위(+ 문맥 압축)는 이 문장으로 한다
+                       (키워드 한 단어로는 크로스 인코더 점수가 낮아 관련 문서도 버려진다)
+    trace를 주면 단계별 소요 시간(index_refresh / answer_cache / embed / faq_vector / retrieve / rerank)을 기록한다.
+    filters(메타 필터)가 있으면 답변 캐시를 보지 않는다 (캐시는 필터 없이 만든 답변).
+    """
+    # 재색인됐거나 FAQ / 동의어가 바뀌었으면 예전에 만든 답변은 버린다
+    # (새 FAQ에 해당하는 질문이 캐시된 Gemini 답변으로 나가지 않도록)
+    with span(trace, "index_refresh"):
+        retriever.refresh()
+        faq_registry.refresh()
+
+    with span(trace, "answer_cache"):
+        answer_cache.check_corpus((retriever.corpus_version, faq_registry.version))
+        cached = None if filters else answer_cache.get_exact(question)
+    if cached is not None:
+        return cached, None, []
 
-        # 3) 기타 오류
-        return f"Gemini API 호출 중 오류가 발생했습니다: {error_msg}"
+    with span(trace, "embed"):
+        query_emb = text_embedder.run(text=question)["embedding"]
+    if FAQ_VECTOR_MATCH:
+        with span(trace, "faq_vector"):
+            faq_emb = query_emb
+            if original_question and original_question != question:
+                faq_emb = text_embedder.run(text=original_question)["embedding"]
+            faq_hit = faq_registry.match_vector(faq_emb)
+        if faq_hit is not None:
+            faq_index, answer, score = faq_hit
+            print(f"📌 FAQ {faq_index}번과 비슷한 질문 (유사도 {score:.3f})")
+            return {"answer": answer, "source": None, "faq": faq_index}, query_emb, []
+    with span(trace, "answer_cache"):
+        cached = None if filters else answer_cache.get_similar(query_emb)
+    if cached is not None:
+        return cached, query_emb, []
+
+    # 재순위를 쓰면 후보를 넉넉히 받아 크로스 인코더로 다시 고른다 (관련 문서가 없으면 빈 목록)
+    with span(trace, "retrieve"):
+        fetch_k = reranker.candidates if reranker is not None else None
+        docs = retriever.run(
+            query_embedding=[query_emb], query=question, top_k=fetch_k, filters=filters
+        )["documents"]
+    if reranker is not None and docs:
+        with span(trace, "rerank"):
+            docs = reranker.run(original_question or question, docs)["documents"]
+    return None, query_emb, docs
 
 def ask_chatbot(question, text_embedder, retriever, prompt_builder):
     """
@@ -293,14 +761,13 @@ def ask_chatbot(question, text_embedder, retriever, prompt_builder):
     print(f"\n[질문] 💬: {question}")
     
     # --- 1단계: 규칙 기반 FAQ 확인 (Req 1 & 2) ---
-    # 기획안의 "키워드 포함 여부" 로직
-    for idx, keywords in enumerate(FAQ_KEYWORDS):
-        for kw in keywords:
-            if kw in question:
-                return FIXED_FAQ_DATABASE[idx]
+    # 기획안의 "키워드 포함 여부" 로직 (FAQ 키워드와 동의어를 한 번에 검사)
+    faq_answer, rep_keyword = match_keywords(question)
+    if faq_answer is not None:
+        return faq_answer
             
     # 2-A) 먼저 동의어 기반 대표 키워드 매핑
-    rep_keyword = find_representative_keyword(question)
+    original_question = question
     if rep_keyword:
         print(f"🔍 동의어 매핑: '{question}' → 대표 키워드 '{rep_keyword}'로 검색")
         question = rep_keyword
@@ -308,33 +775,35 @@ def ask_chatbot(question, text_embedder, retriever, prompt_builder):
     # --- 2단계: RAG + LLM 응답 (Req 3) ---
     print("(규칙 기반 답변 없음. RAG 파이프라인 실행...)")
     try:
-        # (A) 질문을 임베딩으로 변환
-        query_embedding_result = text_embedder.run(text=question)
-        # retriever가 읽을 수 있도록 임베딩만 꺼내는 작업
-        query_embedding = query_embedding_result["embedding"]
-        
-        # (B) 관련 문서 검색
-        retrieved_docs = retriever.run(query_embedding=[query_embedding])["documents"]
-        
+        # (A) 답변 캐시 확인 + 질문 임베딩 + (B) 관련 문서 검색
+        cached, query_embedding, retrieved_docs = lookup_or_retrieve(
+            question, text_embedder, retriever, original_question=original_question
+        )
+        if cached is not None:
+            print(f"[답변] ⚡ (캐시): {cached['answer']}")
+            return cached["answer"]
+
         if not retrieved_docs:
             print("[답변] 🤖 (RAG): 죄송합니다. 문서에서 관련 내용을 찾지 못했습니다.")
             return "죄송합니다. 문서에서 관련 내용을 찾지 못했습니다."
 
         # (C) 프롬프트 생성
-        # 문서 내용을 trimmed 버전으로 변환
-        trimmed_docs = []
-        for d in retrieved_docs:
-            trimmed_content = smart_trim(d.content, 600)
-            trimmed_docs.append(
-                Document(id=d.id, content=trimmed_content, meta=d.meta)
-            )
-
-        prompt_result = prompt_builder.run(documents=trimmed_docs, question=question)
-
-        full_prompt = prompt_result["prompt"]
+        # 문서 내용을 토큰 예산에 맞춰 압축
+        full_prompt = build_prompt(
+            prompt_builder, retrieved_docs, question, original_question=original_question
+        )
         
-        # (D) Gemini API로 답변 생성
-        answer = create_gemini_response(full_prompt)
+        # (D) Gemini API로 답변 생성 (성공한 답변만 캐시)
+        try:
+            answer = call_gemini(full_prompt)
+            answer_cache.put(question, query_embedding, {
+                "answer": answer,
+                "source": format_source(retrieved_docs[0]),
+            })
+        except GeminiUnavailable as e:
+            answer = fallback_answer(retrieved_docs, e)
+        except Exception as e:
+            answer = gemini_error_message(e)
         print(f"[답변] 🤖 (AI 생성): {answer}")
         return answer
         
@@ -359,13 +828,101 @@ def ask_chatbot(question, text_embedder, retriever, prompt_builder):
 #         # (2) 문서 기반 질문 (RAG 사용)
 #         ask_chatbot("정보공개를 청구받은 부서는 며칠 내에 처리 해야해?", text_embedder, retriever, prompt_builder)
 
-@app.on_event("startup")
-def startup_event():
+# 질문 임베딩 + 검색 전용 스레드 풀 (torch / NumPy 연산은 GIL을 풀어서 스레드로 충분)
+rag_executor = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+# 동시에 처리 중인 RAG 요청 수 제한 (admission control)
+rag_slots = asyncio.Semaphore(RAG_MAX_INFLIGHT)
+
+
+# 시작 상태 (/readyz에서 확인)
+startup_state = {"stage": "starting", "ready": False, "error": None, "timings": {}}
+
+
+def run_startup():
+    """모델 / 임베딩 행렬 / Gemini 클라이언트 적재 + 단계별 소요 시간 기록"""
     global text_embedder, retriever, prompt_builder
-    pipeline_components = initialize_chatbot()
-    if pipeline_components:
+    started = time.perf_counter()
+    timings = startup_state["timings"]
+    try:
+        startup_state["stage"] = "loading_pipeline"
+        pipeline_components = initialize_chatbot(timings)
+        if not pipeline_components:
+            startup_state["stage"] = "failed"
+            startup_state["error"] = "RAG 파이프라인 초기화 실패 (서버 로그 확인)"
+            return
         text_embedder, retriever, prompt_builder = pipeline_components
 
+        # Gemini 연결은 요청마다 만들지 않고 시작할 때 한 번
+        startup_state["stage"] = "loading_gemini_client"
+        gemini_started = time.perf_counter()
+        get_gemini_client()
+        timings["gemini_client"] = round(time.perf_counter() - gemini_started, 3)
+
+        startup_state["stage"] = "ready"
+        startup_state["ready"] = True
+    except Exception as e:
+        startup_state["stage"] = "failed"
+        startup_state["error"] = str(e)
+        print(f"❌ 시작 실패: {e}")
+    finally:
+        timings["total"] = round(time.perf_counter() - started, 3)
+        breakdown = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+        print(f"⏱️ 시작 단계별 소요 시간: {breakdown}")
+
+
+def pipeline_ready():
+    return startup_state["ready"]
+
+
+@app.on_event("startup")
+def startup_event():
+    if STARTUP_MODE == "blocking":
+        run_startup()
+    else:
+        # 서버는 바로 요청을 받고(FAQ는 즉시 응답), RAG는 준비가 끝나면 사용
+        threading.Thread(target=run_startup, name="startup", daemon=True).start()
+
+
+@app.get("/healthz")
+async def healthz():
+    """프로세스가 살아 있는지 (liveness)"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """RAG 요청을 받을 준비가 됐는지 (readiness) - 준비 전/실패 시 503"""
+    body = {
+        "ready": startup_state["ready"],
+        "stage": startup_state["stage"],
+        "error": startup_state["error"],
+        "timings": startup_state["timings"],
+    }
+    return JSONResponse(body, status_code=200 if startup_state["ready"] else 503)
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    rag_executor.shutdown(wait=False, cancel_futures=True)
+    if reranker is not None:
+        reranker.close()
+
+
+def read_filters(data):
+    """요청 본문의 "filters"(선택) 검사 → (filters, 오류 메시지)
+
+    예) {"field": "meta.doc_title", "operator": "==", "value": "보수규정"}
+        {"field": "meta.is_current", "operator": "==", "value": true}  ← 현행 개정판만
+    """
+    filters = data.get("filters") or None
+    if filters is None:
+        return None, None
+    try:
+        filters_to_sql(filters, meta_json=False)
+    except ValueError as e:
+        return None, f"⚠️ 검색 필터가 잘못되었습니다: {e}"
+    return filters, None
+
 
 @app.post("/api/chat")
 async def chat(request: Request):
@@ -373,56 +930,217 @@ async def chat(request: Request):
     data = await request.json()
     question = data.get("message", "")
     print(f"💬 사용자 질문: {question}")
+    filters, filter_error = read_filters(data)
+    if filter_error:
+        return {"response": filter_error}
+    trace = RequestTrace("/api/chat")
+    try:
+        # 1️⃣ 규칙 기반 FAQ 먼저 확인 (동의어 대표 키워드도 같이 찾아둔다)
+        with trace.span("keyword_match"):
+            faq_answer, rep_keyword = match_keywords(question)
+        if faq_answer is not None:
+            trace.route = "faq"
+            return {"response": faq_answer}
+
+        # 2️⃣ RAG + Gemini 호출
+        if not pipeline_ready():
+            trace.route = "not_ready"
+            return {"response": NOT_READY_MESSAGE}
+
+        # 처리 중인 요청이 꽉 찼으면 줄 세우지 않고 바로 안내 (FAQ 응답은 영향 없음)
+        if rag_slots.locked():
+            print(f"🚦 RAG 요청 {RAG_MAX_INFLIGHT}개 처리 중 → 혼잡 응답")
+            trace.route = "busy"
+            return {"response": BUSY_MESSAGE}
+
+        async with rag_slots:
+            return await answer_with_rag(question, rep_keyword, trace, filters)
+    finally:
+        trace.finish(SLOW_REQUEST_SECONDS)
 
-    # 1️⃣ 규칙 기반 FAQ 먼저 확인
-    for idx, keywords in enumerate(FAQ_KEYWORDS):
-        for kw in keywords:
-            if kw in question:
-                return {"response": FIXED_FAQ_DATABASE[idx]}
 
+async def rag_answer_events(question, rep_keyword=None, trace=None, filters=None):
+    """RAG 답변을 ("token", 답변 조각) … ("source", 출처) 순서의 이벤트로 내보낸다
 
-    # 2️⃣ RAG + Gemini 호출
+    /api/chat(JSON)와 /api/chat/stream(SSE)이 함께 쓴다.
+    trace를 주면 단계별 소요 시간과 응답 경로(route)를 기록한다.
+    filters: 검색할 문서를 메타로 제한 (이때는 답변 캐시를 쓰지 않는다)
+    """
+    trace = trace or RequestTrace("rag")
+    original_question = question
     try:
-        rep_keyword = find_representative_keyword(question)
         if rep_keyword:
             print(f"🔍 동의어 매핑: '{question}' → '{rep_keyword}'")
             question = rep_keyword
 
-        query_emb = text_embedder.run(text=question)["embedding"]
-        docs = retriever.run(query_embedding=[query_emb])["documents"]
+        # 질문 임베딩 + 검색 (답변 캐시 hit이면 Gemini 호출 생략)
+        loop = asyncio.get_running_loop()
+        cached, query_emb, docs = await loop.run_in_executor(
+            rag_executor, lookup_or_retrieve, question, text_embedder, retriever, trace, filters,
+            original_question,
+        )
+        if cached is not None and "faq" in cached:
+            trace.route = "faq_vector"
+            yield "token", cached["answer"]
+            return
+        if cached is not None:
+            print(f"⚡ 답변 캐시 사용: '{question}'")
+            trace.route = "cache"
+            yield "token", cached["answer"]
+            yield "source", cached["source"]
+            return
 
         if not docs:
-            return {"response": "죄송합니다. 문서에서 관련 내용을 찾지 못했습니다."}
+            trace.route = "no_docs"
+            yield "token", "죄송합니다. 문서에서 관련 내용을 찾지 못했습니다."
+            return
 
-        prompt = prompt_builder.run(documents=docs, question=question)["prompt"]
-        answer = create_gemini_response(prompt)
+        prompt = build_prompt(prompt_builder, docs, question, trace, original_question)
         # 출처 정보 추가 
         # --- 🔥 출처 포맷팅 ---
+        source_text = format_source(docs[0])
+        parts = []
+        llm_started = time.perf_counter()
         try:
-            raw_name = docs[0].meta.get("file_name", "출처 정보 없음")
-            page = docs[0].meta.get("page_number", None)
-
-            # .pdf 제거
-            if raw_name.lower().endswith(".pdf"):
-                clean_name = raw_name[:-4]
-            else:
-                clean_name = raw_name
-
-            # 페이지 번호 있으면 붙이기
-            if page:
-                source_text = f"{clean_name} p.{page}"
+            with trace.span("llm"):
+                async for text in stream_gemini_async(prompt):
+                    if not parts:
+                        trace.stages["llm_first_token"] = time.perf_counter() - llm_started
+                    parts.append(text)
+                    yield "token", text
+        except Exception as e:
+            trace.route = "llm_error"
+            # 오류 안내는 캐시하지 않는다
+            if isinstance(e, GeminiUnavailable) and not parts:
+                # 한도 초과 / 회로 차단 → 검색된 문서를 그대로 보여준다
+                yield "token", fallback_answer(docs, e)
             else:
-                source_text = clean_name
+                yield "token", ("\n\n" if parts else "") + gemini_error_message(e)
+            yield "source", source_text
+            return
 
-            answer += f"\n\n📄 출처: {source_text}"
+        if not filters:
+            answer_cache.put(question, query_emb, {"answer": "".join(parts), "source": source_text})
+        yield "source", source_text
 
-        except Exception:
-            answer += "\n\n📄 출처: 알 수 없음"
-        return {"response": answer}
-    
     except Exception as e:
-        return {"response": f"서버 오류 발생: {str(e)}"}
-    
+        trace.route = "error"
+        yield "token", f"서버 오류 발생: {str(e)}"
+
+
+async def answer_with_rag(question, rep_keyword=None, trace=None, filters=None):
+    """rag_answer_events를 모아 기존 JSON 응답 형식으로"""
+    parts = []
+    source_text = None
+    async for event, text in rag_answer_events(question, rep_keyword, trace, filters):
+        if event == "token":
+            parts.append(text)
+        else:
+            source_text = text
+
+    answer = "".join(parts)
+    if source_text:
+        answer += f"\n\n📄 출처: {source_text}"
+    return {"response": answer}
+
+
+# --- 스트리밍 응답 (Server-Sent Events) ---
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def single_message_events(text):
+    yield "token", text
+
+
+def release_once(semaphore):
+    """여러 곳에서 불러도 semaphore를 한 번만 돌려주는 함수"""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            semaphore.release()
+    return release
+
+
+async def rag_events_with_slot(question, rep_keyword, trace, filters, release):
+    """이미 잡아 둔 RAG 슬롯으로 답변 이벤트를 흘리고, 끝나면(클라이언트가 끊어도) 슬롯을 돌려준다"""
+    try:
+        async for item in rag_answer_events(question, rep_keyword, trace, filters):
+            yield item
+    finally:
+        release()
+
+
+async def sse_stream(events, trace):
+    """(event, text) 이벤트 → SSE 프레임, 마지막에 done 이벤트로 첫 토큰 시간(TTFT)/전체 시간"""
+    start = trace.started
+    ttft = None
+    try:
+        async for event, text in events:
+            if event == "token" and ttft is None:
+                ttft = time.perf_counter() - start
+            yield sse_event(event, {"text": text})
+
+        total = time.perf_counter() - start
+        ttft = total if ttft is None else ttft
+        print(f"⏱️ 스트리밍 응답: 첫 토큰 {ttft * 1000:.0f}ms / 전체 {total * 1000:.0f}ms")
+        yield sse_event("done", {"ttft_ms": round(ttft * 1000), "total_ms": round(total * 1000)})
+    finally:
+        # 클라이언트가 중간에 끊어도 기록
+        trace.finish(SLOW_REQUEST_SECONDS)
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: Request):
+    """/api/chat의 스트리밍 버전
+
+    event: token  → {"text": 답변 조각} (여러 번)
+    event: source → {"text": 출처}      (있을 때 한 번)
+    event: done   → {"ttft_ms", "total_ms"}
+    """
+    trace = RequestTrace("/api/chat/stream")
+    data = await request.json()
+    question = data.get("message", "")
+    print(f"💬 사용자 질문(스트리밍): {question}")
+    filters, filter_error = read_filters(data)
+
+    with trace.span("keyword_match"):
+        faq_answer, rep_keyword = match_keywords(question)
+    background = None
+    if filter_error:
+        trace.route = "bad_request"
+        events = single_message_events(filter_error)
+    elif faq_answer is not None:
+        trace.route = "faq"
+        events = single_message_events(faq_answer)
+    elif not pipeline_ready():
+        trace.route = "not_ready"
+        events = single_message_events(NOT_READY_MESSAGE)
+    elif rag_slots.locked():
+        print(f"🚦 RAG 요청 {RAG_MAX_INFLIGHT}개 처리 중 → 혼잡 응답")
+        trace.route = "busy"
+        events = single_message_events(BUSY_MESSAGE)
+    else:
+        # 본문이 흐르기 시작할 때가 아니라 지금 슬롯을 잡는다
+        # (확인과 획득 사이에 await가 없어 동시 요청이 함께 통과해 줄을 서지 않는다)
+        await rag_slots.acquire()
+        release = release_once(rag_slots)
+        events = rag_events_with_slot(question, rep_keyword, trace, filters, release)
+        # 본문이 시작되기 전에 연결이 끊겨도 응답이 끝나면 돌려준다
+        background = BackgroundTask(release)
+
+    return StreamingResponse(
+        sse_stream(events, trace),
+        media_type="text/event-stream",
+        # 프록시가 모아서 보내지 않도록
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background,
+    )
+
+
 @app.post("/api/faq")
 async def faq(request: Request):
     data = await request.json()
@@ -432,9 +1150,102 @@ async def faq(request: Request):
     if faq_number is None or not isinstance(faq_number, int):
         return {"response": "FAQ 번호가 잘못 전달되었습니다."}
 
-    # 리스트 범위 검사
-    if faq_number < 0 or faq_number >= len(FIXED_FAQ_DATABASE):
+    # 리스트 범위 검사 + 해당 FAQ 답변을 반환
+    answer = faq_registry.answer(faq_number)
+    if answer is None:
         return {"response": "해당 FAQ 항목이 존재하지 않습니다."}
+    return {"response": answer}
+
+
+@app.get("/api/faq")
+async def faq_list():
+    """FAQ 버튼 목록 (faq.json 순서 = POST /api/faq의 faq_number)"""
+    return {"faqs": [{"faq_number": i, "question": q} for i, q in enumerate(faq_registry.questions())]}
+
+
+def collect_stats():
+    """캐시 적중률 / Gemini 호출 통계 (/api/stats, /metrics 공용)"""
+    result = {"answer_cache": answer_cache.stats(), "faq": faq_registry.stats()}
+    if isinstance(text_embedder, CachedTextEmbedder):
+        result["query_embedding_cache"] = text_embedder.stats()
+    if gemini_client is not None:
+        result["gemini"] = dict(gemini_client.stats, breaker=gemini_client.breaker.state)
+    if reranker is not None:
+        result["reranker"] = reranker.stats()
+    return result
+
+
+@app.get("/api/stats")
+async def stats():
+    """캐시 적중률 등 운영 통계"""
+    return collect_stats()
+
+
+# --- Prometheus 지표 (/metrics) ---
+# 단계별/요청별 소요 시간 히스토그램은 metrics.py, 아래는 이미 세고 있는 통계를 그대로 내보내는 값
+def cache_hit_ratios():
+    stats = collect_stats()
+    return {(name,): stats[name]["hit_rate"] for name in ("answer_cache", "query_embedding_cache") if name in stats}
+
+
+def cache_lookups():
+    stats = collect_stats()
+    values = {}
+    answer = stats["answer_cache"]
+    values[("answer_cache", "exact_hit")] = answer["exact_hits"]
+    values[("answer_cache", "semantic_hit")] = answer["semantic_hits"]
+    values[("answer_cache", "miss")] = answer["misses"]
+    if "query_embedding_cache" in stats:
+        values[("query_embedding_cache", "hit")] = stats["query_embedding_cache"]["hits"]
+        values[("query_embedding_cache", "miss")] = stats["query_embedding_cache"]["misses"]
+    return values
+
+
+def rerank_events():
+    if reranker is None:
+        return {}
+    return {(event,): count for event, count in reranker.stats_counts.items()}
+
+
+def faq_events():
+    return {(event,): count for event, count in faq_registry.stats_counts.items()}
+
+
+def gemini_events():
+    if gemini_client is None:
+        return {}
+    return {(event,): count for event, count in gemini_client.stats.items()}
+
+
+REGISTRY.register(CallbackMetric(
+    "hibot_cache_hit_ratio", "캐시 적중률 (0~1)", cache_hit_ratios, ["cache"]
+))
+REGISTRY.register(CallbackMetric(
+    "hibot_cache_lookups_total", "캐시 조회 수", cache_lookups, ["cache", "result"], metric_type="counter"
+))
+REGISTRY.register(CallbackMetric(
+    "hibot_gemini_events_total",
+    "Gemini 호출 통계 (calls / retries / rate_limited=429 / failures / hedged / short_circuited)",
+    gemini_events, ["event"], metric_type="counter",
+))
+REGISTRY.register(CallbackMetric(
+    "hibot_rerank_events_total", "재순위 통계 (calls / timeouts / errors / no_relevant)",
+    rerank_events, ["event"], metric_type="counter",
+))
+REGISTRY.register(CallbackMetric(
+    "hibot_faq_events_total", "FAQ 통계 (reloads / reload_errors / keyword_hits / vector_hits)",
+    faq_events, ["event"], metric_type="counter",
+))
+REGISTRY.register(CallbackMetric(
+    "hibot_gemini_breaker_open", "Gemini 회로 차단기가 열려 있으면 1",
+    lambda: {(): int(gemini_client is not None and gemini_client.breaker.state == "open")},
+))
+REGISTRY.register(CallbackMetric(
+    "hibot_ready", "RAG 파이프라인 준비 완료면 1", lambda: {(): int(pipeline_ready())}
+))
+
 
-    # 해당 FAQ 답변을 반환
-    return {"response": FIXED_FAQ_DATABASE[faq_number]}
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 스크레이프용 (워커가 여럿이면 응답한 워커의 값)"""
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
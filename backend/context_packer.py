@@ -0,0 +1,118 @@
+# context_packer.py
+# 검색된 청크를 토큰 예산 안에 맞춰 프롬프트용 문맥으로 압축
+#
+# 1) 같은 파일의 이웃 청크(split_id 연속)는 하나로 합치고, 150단어 겹침은 한 번만 남긴다
+# 2) 합친 본문을 문장 단위로 나누고 질문과 겹치는 바이그램이 많은 문장부터 고른다
+# 3) 예산(토큰 추정치)이 찰 때까지 고른 문장(같은 문장은 한 번만)을 원래 순서대로 이어 붙인다
+import re
+
+from haystack.dataclasses import Document
+
+from lexical_index import tokenize
+
+
+_HANGUL_RE = re.compile(r"[가-힣]")
+_SENTENCE_RE = re.compile(r".+?(?:다\.|요\.|함\.|[.!?](?=\s)|\n|$)", re.S)
+
+
+def estimate_tokens(text):
+    """Gemini 토큰 수 추정치 (한글 약 1.5자, 그 밖의 문자 약 4자당 1토큰)"""
+    if not text:
+        return 0
+    hangul = len(_HANGUL_RE.findall(text))
+    others = len(text) - hangul - text.count(" ")
+    return int(hangul / 1.5 + others / 4) + 1
+
+
+def merge_overlap(first, second, max_overlap=200):
+    """first 끝과 second 앞이 단어 단위로 겹치면 한 번만 남기고 잇는다"""
+    a, b = first.split(), second.split()
+    for k in range(min(max_overlap, len(a), len(b)), 0, -1):
+        if a[-k:] == b[:k]:
+            return " ".join(a + b[k:])
+    return " ".join(a + b)
+
+
+def group_neighbours(docs):
+    """검색 순위를 유지하면서 같은 파일의 연속 청크를 묶는다 → [(대표 순위, [docs...])]"""
+    groups = []
+    by_position = {}
+    for rank, doc in enumerate(docs):
+        file_name = doc.meta.get("file_name")
+        split_id = doc.meta.get("split_id")
+        group = None
+        if split_id is not None:
+            group = by_position.get((file_name, split_id - 1)) or by_position.get((file_name, split_id + 1))
+        if group is None:
+            group = [rank, []]
+            groups.append(group)
+        group[1].append(doc)
+        if split_id is not None:
+            by_position[(file_name, split_id)] = group
+
+    for group in groups:
+        group[1].sort(key=lambda d: d.meta.get("split_id", 0))
+    return groups
+
+
+def split_sentences(text, max_words=60):
+    """문장부호 기준으로 나누고, 부호 없이 긴 구간(OCR 표 등)은 max_words 단어씩 자른다"""
+    sentences = []
+    for sentence in _SENTENCE_RE.findall(text):
+        words = sentence.split()
+        for i in range(0, len(words), max_words):
+            sentences.append(" ".join(words[i:i + max_words]))
+    return sentences
+
+
+def pack_context(docs, question, budget_tokens=1500):
+    """docs(검색 순위순)를 budget_tokens 안의 문맥 Document 목록으로
+
+    반환: (packed_docs, context_tokens)
+    """
+    query_terms = set(tokenize(question))
+
+    # (1) 이웃 청크 합치기 + 문장 분할
+    sections = []
+    for group_rank, members in group_neighbours(docs):
+        text = members[0].content or ""
+        for doc in members[1:]:
+            text = merge_overlap(text, doc.content or "")
+        sentences = split_sentences(text)
+        meta = dict(members[0].meta)
+        meta["page_start"] = min(d.meta.get("page_start", d.meta.get("page_number", 0)) or 0 for d in members)
+        meta["page_end"] = max(d.meta.get("page_end", d.meta.get("page_number", 0)) or 0 for d in members)
+        sections.append((group_rank, members[0].id, meta, sentences))
+
+    # (2) 문장 점수: 질문 바이그램이 문장에 몇 개 있는지
+    candidates = []
+    for section_idx, (group_rank, _, _, sentences) in enumerate(sections):
+        for pos, sentence in enumerate(sentences):
+            overlap = len(query_terms.intersection(tokenize(sentence))) if query_terms else 0
+            candidates.append((-overlap, group_rank, pos, section_idx, sentence))
+    candidates.sort(key=lambda c: c[:3])
+
+    # (3) 예산 안에서 고르기
+    chosen = {}
+    seen = set()
+    used = 0
+    for _, _, pos, section_idx, sentence in candidates:
+        cost = estimate_tokens(sentence)
+        if sentence in seen or used + cost > budget_tokens:
+            continue
+        seen.add(sentence)
+        chosen.setdefault(section_idx, []).append(pos)
+        used += cost
+
+    packed = []
+    for section_idx in sorted(chosen, key=lambda i: sections[i][0]):
+        _, doc_id, meta, sentences = sections[section_idx]
+        positions = sorted(chosen[section_idx])
+        parts = []
+        for i, pos in enumerate(positions):
+            if i and pos != positions[i - 1] + 1:
+                parts.append("…")
+            parts.append(sentences[pos])
+        packed.append(Document(id=doc_id, content=" ".join(parts), meta=meta))
+
+    return packed, used
@@ -0,0 +1,68 @@
+# embedding_cache.py
+# 질문 임베딩 LRU 캐시
+#
+# 동의어 매핑으로 많은 질문이 "시간외근무" 같은 같은 문자열이 되므로,
+# 정규화한 질문 문자열 → 임베딩을 기억해 ko-sbert 계산을 건너뛴다.
+import threading
+from collections import OrderedDict
+
+from answer_cache import normalize_question
+
+
+class CachedTextEmbedder:
+    """SentenceTransformersTextEmbedder 앞에 붙이는 캐시 (run() 인터페이스 동일, 스레드 안전)"""
+
+    def __init__(self, embedder, max_entries=1024):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def warm_up(self):
+        self.embedder.warm_up()
+
+    def run(self, text):
+        key = normalize_question(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return {"embedding": embedding}
+            self.misses += 1
+
+        # 모델 계산은 잠금 밖에서 (같은 질문이 동시에 오면 두 번 계산될 수 있지만 결과는 같다)
+        embedding = self.embedder.run(text=text)["embedding"]
+        self._store(key, embedding)
+        return {"embedding": embedding}
+
+    def _store(self, key, embedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def preload(self, texts):
+        """자주 나오는 질문(대표 키워드 등)을 미리 계산해 둔다 - 통계에는 넣지 않음"""
+        count = 0
+        for text in texts:
+            key = normalize_question(text)
+            if not key or key in self._entries:
+                continue
+            self._store(key, self.embedder.run(text=text)["embedding"])
+            count += 1
+        return count
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
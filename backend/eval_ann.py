@@ -0,0 +1,79 @@
+# eval_ann.py
+# IVF 근사 검색 vs 전수 비교(exact) recall@k / 지연시간 비교 스크립트
+#
+# 사용 예:
+#   python eval_ann.py                       # hibot_store.ivf.npz 사용 (없으면 메모리에서 생성)
+#   python eval_ann.py --k 6 --nprobe 1 2 4 8 16 32 --queries 300
+#
+# 질문 임베딩 대신 DB 문서 임베딩에 약간의 노이즈를 섞어 쿼리로 사용한다.
+# recall@k = IVF 결과 k개 중 exact 결과 k개와 겹치는 비율
+import argparse
+import os
+import time
+
+import duckdb
+import numpy as np
+
+from ann_index import IVFFlatIndex, ivf_index_path, top_k_indices
+from vector_store import load_embedding_matrix, normalize_rows
+
+DB_PATH = "hibot_store.db"
+
+
+def make_queries(matrix, n_queries, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(n_queries, matrix.shape[0]), replace=False)
+    queries = matrix[rows] + rng.normal(scale=noise, size=(len(rows), matrix.shape[1])).astype(np.float32)
+    return normalize_rows(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05, help="쿼리에 섞을 노이즈 크기")
+    parser.add_argument("--nlist", type=int, default=None, help="색인 파일 대신 이 nlist로 새로 만들어 비교")
+    args = parser.parse_args()
+
+    conn = duckdb.connect(args.db, read_only=True)
+    ids, _, matrix = load_embedding_matrix(conn, with_meta=False)
+    conn.close()
+
+    if len(ids) == 0:
+        print("❌ 임베딩이 없습니다. 먼저 build_index.py를 실행하세요.")
+        return
+
+    index_path = ivf_index_path(args.db)
+    if args.nlist is None and os.path.exists(index_path):
+        index = IVFFlatIndex.load(index_path)
+        if not np.array_equal(index.ids, ids):
+            print("⚠️ 색인 파일이 DB와 맞지 않아 메모리에서 새로 만듭니다.")
+            index = IVFFlatIndex.build(matrix, ids)
+    else:
+        index = IVFFlatIndex.build(matrix, ids, nlist=args.nlist)
+
+    queries = make_queries(matrix, args.queries, args.noise)
+    print(f"📊 문서 {len(ids)}개, 쿼리 {len(queries)}개, k={args.k}, nlist={index.nlist}")
+
+    # 기준: 전수 비교
+    start = time.perf_counter()
+    exact = [top_k_indices(matrix @ q, args.k) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"{'exact':>12} | recall@{args.k} 1.0000 | {exact_ms:7.3f} ms/query")
+
+    for nprobe in args.nprobe:
+        hits = 0
+        start = time.perf_counter()
+        results = [index.search(matrix, q, args.k, nprobe)[0] for q in queries]
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        for truth, found in zip(exact, results):
+            hits += len(np.intersect1d(truth, found))
+        recall = hits / sum(len(t) for t in exact)
+        print(f"{'nprobe=' + str(nprobe):>12} | recall@{args.k} {recall:.4f} | {ivf_ms:7.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# faq_registry.py
+# FAQ / 동의어 등록부 (파일을 고치면 재시작 없이 다음 요청부터 반영)
+#
+# faq.json          : FAQ 목록 (순서 = /api/faq의 faq_number)
+#   [{"question": 버튼 문구, "answer": 표준 답변,
+#     "keywords": [질문에 포함되면 바로 답변], "examples": [비슷한 질문 예시 (벡터 FAQ용)]}]
+# synonym_map.json  : 대표 키워드 → 동의어 목록
+#
+# 두 파일의 수정시각/크기가 바뀌면 FaqSnapshot(FAQ + 동의어 + 키워드 매처)을 새로 만들어 통째로 교체한다.
+# → 요청 하나는 한 스냅샷만 보므로 매칭된 FAQ 번호와 답변이 어긋나지 않는다.
+# 파일이 깨졌으면(편집 도중 등) 그 파일은 이전 내용을 그대로 쓴다.
+# 파일은 워커 프로세스마다 따로 지켜보므로 여러 uvicorn 워커에서도 모두 반영된다.
+#
+# 벡터 FAQ: question + examples 문장을 미리 임베딩해 두고,
+# 키워드가 걸리지 않은 질문도 코사인 유사도가 threshold 이상이면 FAQ 답변으로 바로 응답한다 (RAG + Gemini 생략).
+import json
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from keyword_matcher import build_keyword_matcher
+from vector_store import normalize_rows
+
+
+FaqEntry = namedtuple("FaqEntry", ["question", "answer", "keywords", "examples"])
+# signature: 읽어온 파일들의 (수정시각, 크기) - 바뀌었는지 비교용
+FaqSnapshot = namedtuple("FaqSnapshot", ["signature", "entries", "synonyms", "matcher"])
+# 한 번에 찾은 결과 (FAQ 답변이 있으면 rep_keyword는 None)
+FaqMatch = namedtuple("FaqMatch", ["faq_index", "answer", "rep_keyword"])
+
+
+def _string_list(value, name):
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{name}은(는) 문자열 리스트여야 합니다: {value!r}")
+    return [v for v in value if v.strip()]
+
+
+def load_faq_entries(path):
+    """faq.json → FaqEntry 목록 (형식이 틀리면 ValueError, 파일이 없으면 빈 목록)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        print(f"⚠️ FAQ 파일이 없습니다: {path}")
+        return []
+    if not isinstance(raw, list):
+        raise ValueError("faq.json은 FAQ 항목 리스트여야 합니다")
+
+    entries = []
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict) or not isinstance(item.get("answer"), str) or not item["answer"].strip():
+            raise ValueError(f"FAQ {i}번 항목에 answer가 없습니다")
+        entries.append(FaqEntry(
+            question=str(item.get("question") or ""),
+            answer=item["answer"],
+            keywords=_string_list(item.get("keywords"), f"FAQ {i}번 keywords"),
+            examples=_string_list(item.get("examples"), f"FAQ {i}번 examples"),
+        ))
+    return entries
+
+
+def load_synonym_map(path):
+    """synonym_map.json → {대표 키워드: [동의어...]} (파일이 없으면 빈 dict)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        print(f"⚠️ 동의어 파일이 없습니다: {path}")
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("synonym_map.json은 {대표 키워드: [동의어...]} 형식이어야 합니다")
+    return {rep: _string_list(synonyms, f"동의어 '{rep}'") for rep, synonyms in raw.items()}
+
+
+class FaqRegistry:
+    """FAQ / 동의어 / 키워드 매처 / FAQ 문장 임베딩을 한 번에 교체하는 등록부 (스레드 안전)
+
+    refresh()는 파일 stat 두 번이라 요청마다 불러도 된다.
+    임베딩은 attach_embedder() 뒤에 prepare_vectors()가 스냅샷이 바뀐 경우에만 다시 계산한다.
+    """
+
+    def __init__(self, faq_path, synonym_path, threshold=0.85):
+        self.faq_path = faq_path
+        self.synonym_path = synonym_path
+        self.threshold = threshold
+        self.embedder = None
+
+        self.snapshot = FaqSnapshot(None, [], {}, build_keyword_matcher([], {}))
+        # (임베딩한 entries, 문장별 FAQ 번호, 정규화된 행렬)
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._embed_lock = threading.Lock()
+        self.stats_counts = {"reloads": 0, "reload_errors": 0, "keyword_hits": 0, "vector_hits": 0}
+        self.refresh()
+
+    # ------------------------------
+    # 파일 감시 / 교체
+    # ------------------------------
+    def _file_signature(self):
+        signature = []
+        for path in (self.faq_path, self.synonym_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    @property
+    def version(self):
+        """현재 스냅샷 버전 (FAQ / 동의어 파일이 바뀌면 달라진다 - 답변 캐시 무효화용)"""
+        return self.snapshot.signature
+
+    def refresh(self):
+        """파일이 바뀌었으면 다시 읽어 스냅샷을 교체 → 교체했으면 True"""
+        signature = self._file_signature()
+        if signature == self.snapshot.signature:
+            return False
+        with self._lock:
+            if signature == self.snapshot.signature:
+                return False
+            # 깨진 파일은 이전 내용을 그대로 쓰고, 나머지 파일은 반영
+            errors = []
+            try:
+                entries = load_faq_entries(self.faq_path)
+            except Exception as e:
+                entries = self.snapshot.entries
+                errors.append(f"{self.faq_path}: {e}")
+            try:
+                synonyms = load_synonym_map(self.synonym_path)
+            except Exception as e:
+                synonyms = self.snapshot.synonyms
+                errors.append(f"{self.synonym_path}: {e}")
+            if errors:
+                self.stats_counts["reload_errors"] += 1
+                print(f"⚠️ FAQ/동의어 파일 불러오기 실패 → 이전 내용 유지: {'; '.join(errors)}")
+
+            matcher = build_keyword_matcher([entry.keywords for entry in entries], synonyms)
+            self.snapshot = FaqSnapshot(signature, entries, synonyms, matcher)
+            self.stats_counts["reloads"] += 1
+        print(f"📚 FAQ {len(entries)}개 / 동의어 대표 키워드 {len(synonyms)}개 불러옴 (키워드 {len(matcher)}개)")
+        return True
+
+    # ------------------------------
+    # 조회
+    # ------------------------------
+    def match(self, question):
+        """키워드 매칭 → FaqMatch (FAQ 키워드가 동의어보다 우선, 아무것도 없으면 모두 None)"""
+        self.refresh()
+        snapshot = self.snapshot
+        hit = snapshot.matcher.best(question)
+        if hit is None:
+            return FaqMatch(None, None, None)
+        if hit.kind == "faq":
+            self._count("keyword_hits")
+            return FaqMatch(hit.value, snapshot.entries[hit.value].answer, None)
+        return FaqMatch(None, None, hit.value)
+
+    def answer(self, faq_index):
+        """faq_index번 FAQ 답변 (범위 밖이면 None)"""
+        self.refresh()
+        entries = self.snapshot.entries
+        return entries[faq_index].answer if 0 <= faq_index < len(entries) else None
+
+    def questions(self):
+        self.refresh()
+        return [entry.question for entry in self.snapshot.entries]
+
+    def warm_texts(self):
+        """질문 임베딩 캐시 예열용 (대표 키워드 + FAQ 키워드)"""
+        snapshot = self.snapshot
+        return list(snapshot.synonyms) + [kw for entry in snapshot.entries for kw in entry.keywords]
+
+    # ------------------------------
+    # 벡터 FAQ
+    # ------------------------------
+    def attach_embedder(self, embedder):
+        """질문 임베더를 연결하고 FAQ 문장을 미리 임베딩 → 임베딩한 문장 수"""
+        self.embedder = embedder
+        return self.prepare_vectors()
+
+    def prepare_vectors(self):
+        """현재 스냅샷의 FAQ 문장(question + examples) 임베딩 (FAQ가 바뀐 경우에만 다시 계산)"""
+        if self.embedder is None:
+            return 0
+        entries = self.snapshot.entries
+        vectors = self._vectors
+        if vectors is not None and vectors[0] is entries:
+            return len(vectors[1])
+
+        with self._embed_lock:
+            vectors = self._vectors
+            if vectors is not None and vectors[0] is entries:
+                return len(vectors[1])
+            faq_ids, texts = [], []
+            for idx, entry in enumerate(entries):
+                for text in (entry.question, *entry.examples):
+                    if text.strip():
+                        faq_ids.append(idx)
+                        texts.append(text)
+            if texts:
+                matrix = np.asarray(
+                    [self.embedder.run(text=text)["embedding"] for text in texts], dtype=np.float32
+                )
+                matrix = normalize_rows(matrix)
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            self._vectors = (entries, np.asarray(faq_ids, dtype=np.int64), matrix)
+        print(f"🧭 FAQ 문장 {len(texts)}개 임베딩 완료 (벡터 FAQ 기준 {self.threshold})")
+        return len(texts)
+
+    def match_vector(self, query_embedding):
+        """질문 임베딩과 가장 가까운 FAQ 문장이 threshold 이상이면 (faq_index, answer, score), 아니면 None"""
+        self.prepare_vectors()
+        vectors = self._vectors
+        if vectors is None or len(vectors[1]) == 0:
+            return None
+        entries, faq_ids, matrix = vectors
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != matrix.shape[1]:
+            return None
+        scores = matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        self._count("vector_hits")
+        faq_index = int(faq_ids[best])
+        return faq_index, entries[faq_index].answer, float(scores[best])
+
+    # ------------------------------
+    # 통계
+    # ------------------------------
+    def _count(self, key):
+        with self._lock:
+            self.stats_counts[key] += 1
+
+    def stats(self):
+        snapshot = self.snapshot
+        vectors = self._vectors
+        with self._lock:
+            return dict(
+                self.stats_counts,
+                faqs=len(snapshot.entries),
+                synonyms=len(snapshot.synonyms),
+                vector_sentences=len(vectors[1]) if vectors is not None else 0,
+            )
@@ -0,0 +1,307 @@
+# gemini_client.py
+# 서버 전체가 같이 쓰는 Gemini 클라이언트
+#
+# - genai.configure / GenerativeModel은 시작할 때 한 번만 (내부 HTTP/gRPC 연결 재사용)
+# - 토큰 버킷으로 초당 호출 수를 제한해 동시 요청이 한꺼번에 429를 맞지 않게 한다
+# - 429/5xx/타임아웃은 지터를 섞은 지수 백오프로 재시도
+# - (선택) hedge_delay 안에 첫 응답이 없으면 같은 요청을 하나 더 보내 먼저 온 쪽을 사용
+# - 연속 실패가 쌓이면 회로 차단기가 열려 cooldown 동안 바로 GeminiUnavailable
+#   → 호출하는 쪽은 검색된 문서를 그대로 보여주는 식으로 대체 응답을 만든다
+import asyncio
+import random
+import threading
+import time
+
+
+class GeminiUnavailable(Exception):
+    """재시도 후에도 실패했거나 회로 차단기가 열려 있어 답변을 만들 수 없음 (cause에 마지막 오류)"""
+
+    def __init__(self, message, cause=None):
+        super().__init__(message)
+        self.cause = cause
+
+
+def is_retryable(error):
+    """잠시 후 다시 하면 될 수 있는 오류인지 (한도 초과 / 서버 과부하 / 타임아웃)"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    message = str(error)
+    return any(mark in message for mark in ("429", "Resource exhausted", "500", "503", "504", "Deadline", "unavailable"))
+
+
+class TokenBucket:
+    """초당 rate개, 최대 burst개까지 모아두는 토큰 버킷 (스레드/코루틴 공용)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """토큰 하나를 예약하고, 실제로 쓸 수 있을 때까지 기다려야 하는 시간(초)을 반환"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def try_acquire(self):
+        """지금 남은 토큰이 있을 때만 하나 쓰고 True (기다리지도, 빚지지도 않는다)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """연속 failure_threshold번 실패하면 cooldown초 동안 열림, 그 뒤 한 번 시험 호출(half-open)"""
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # half-open: 이번 호출 결과로 닫을지 다시 열지 결정
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"🔌 Gemini 연속 {self.failures}회 실패 → {self.cooldown:.0f}초 동안 호출 중단")
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self.opened_at < self.cooldown else "half-open"
+
+
+class GeminiClient:
+    def __init__(
+        self,
+        api_key,
+        model_name="gemini-2.0-flash",
+        rate_per_sec=2.0,
+        burst=5,
+        max_retries=3,
+        base_delay=0.5,
+        max_delay=8.0,
+        timeout=30.0,
+        hedge_delay=None,
+        failure_threshold=5,
+        cooldown=30.0,
+        api_endpoint=None,
+    ):
+        # google.generativeai는 import만 1초 가까이 걸려 클라이언트를 만들 때 불러온다
+        import google.generativeai as genai
+
+        # api_endpoint: 테스트용 로컬 스텁 서버 주소 등 (REST로 연결)
+        # genai의 REST 전송은 비동기 호출을 지원하지 않아 stream()은 스레드에서 한 번에 받아온다
+        self.rest = bool(api_endpoint)
+        if api_endpoint:
+            genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": api_endpoint})
+        else:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "failures": 0, "hedged": 0, "short_circuited": 0}
+
+    # ------------------------------
+    # 공통
+    # ------------------------------
+    def _backoff(self, attempt):
+        """지터를 섞은 지수 백오프 (full jitter)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise GeminiUnavailable("Gemini 회로 차단기 열림")
+
+    def _record_error(self, error):
+        if "429" in str(error) or "Resource exhausted" in str(error):
+            self.stats["rate_limited"] += 1
+
+    def _give_up(self, error):
+        self.stats["failures"] += 1
+        self.breaker.record_failure()
+        if is_retryable(error):
+            raise GeminiUnavailable(f"Gemini 호출 실패: {error}", cause=error) from error
+        raise error
+
+    # ------------------------------
+    # 동기 호출 (ask_chatbot용)
+    # ------------------------------
+    def generate(self, prompt):
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.stats["calls"] += 1
+            try:
+                response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+                text = response.text
+            except Exception as e:
+                self._record_error(e)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._give_up(e)
+                self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            return text
+
+    # ------------------------------
+    # 비동기 스트리밍 (/api/chat용)
+    # ------------------------------
+    async def stream(self, prompt):
+        """답변 조각을 생성되는 대로 내보낸다
+
+        재시도/헤징은 첫 조각이 오기 전까지만 한다 (이미 보낸 조각은 되돌릴 수 없으므로).
+        """
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            try:
+                iterator, first = await self._open_stream_hedged(prompt)
+                break
+            except Exception as e:
+                self._record_error(e)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._give_up(e)
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+
+        self.breaker.record_success()
+        if first:
+            yield first
+        while True:
+            try:
+                # 조각 사이가 timeout 이상 비면 끊긴 것으로 본다
+                chunk = await asyncio.wait_for(iterator.__anext__(), self.timeout)
+            except StopAsyncIteration:
+                return
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+
+    async def _open_stream(self, prompt):
+        """토큰을 받은 뒤 요청을 보내고 첫 조각까지 받아온다 → (나머지 iterator, 첫 텍스트)"""
+        await self.bucket.acquire_async()
+        return await self._send_stream(prompt)
+
+    async def _send_stream(self, prompt):
+        """(토큰은 이미 받은 상태) 요청을 보내고 첫 조각까지 받아온다"""
+        self.stats["calls"] += 1
+
+        async def open_and_read_first():
+            if self.rest:
+                response = await asyncio.to_thread(
+                    self.model.generate_content, prompt, request_options={"timeout": self.timeout}
+                )
+                return _EMPTY_STREAM, response.text
+
+            response = await self.model.generate_content_async(
+                prompt, stream=True, request_options={"timeout": self.timeout}
+            )
+            iterator = response.__aiter__()
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, ""
+            return iterator, _chunk_text(first)
+
+        return await asyncio.wait_for(open_and_read_first(), self.timeout)
+
+    async def _open_stream_hedged(self, prompt):
+        if self.hedge_delay is None:
+            return await self._open_stream(prompt)
+
+        # 헤지 대기 시간은 토큰을 받은 뒤부터 잰다 (토큰을 기다리는 건 느린 게 아니다)
+        await self.bucket.acquire_async()
+        primary = asyncio.ensure_future(self._send_stream(prompt))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        # 호출 한도에 걸려 남은 토큰이 없으면 헤지하지 않는다 (요청을 두 배로 늘리지 않도록)
+        if not self.bucket.try_acquire():
+            return await primary
+
+        # 첫 요청이 늦으면 같은 요청을 하나 더 보내고 먼저 성공한 쪽을 쓴다
+        self.stats["hedged"] += 1
+        hedge = asyncio.ensure_future(self._send_stream(prompt))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+
+class _EmptyStream:
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+_EMPTY_STREAM = _EmptyStream()
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # 텍스트가 없는 조각 (안전 필터 등)
+        return ""
@@ -0,0 +1,102 @@
+# keyword_matcher.py
+# FAQ 키워드 / 동의어를 한 번에 찾는 Aho–Corasick 다중 패턴 매처
+#
+# 키워드 수와 상관없이 질문을 한 번만 훑어서 모든 키워드 등장을 찾는다.
+# 여러 키워드가 걸리면 우선순위로 하나를 고른다:
+#   1) FAQ 키워드가 동의어보다 먼저 (기존 "FAQ 확인 → 동의어 매핑" 순서와 동일)
+#   2) 같은 종류면 더 긴 키워드
+#   3) 길이도 같으면 등록 순서 (FAQ_KEYWORDS / synonym_map.json 순서)
+from collections import deque, namedtuple
+
+
+# kind: "faq" | "synonym", value: FAQ 번호 또는 대표 키워드
+KeywordHit = namedtuple("KeywordHit", ["kind", "value", "keyword"])
+
+KIND_PRIORITY = {"faq": 0, "synonym": 1}
+
+
+class KeywordMatcher:
+    def __init__(self, patterns):
+        """patterns: (keyword, kind, value) 목록 - 등록 순서가 동점 처리 기준"""
+        self.hits = []
+        self._priority = []
+
+        # 트라이: goto[node] = {문자: 다음 노드}, own[node] = 이 노드에서 끝나는 패턴 번호들
+        self._goto = [{}]
+        own = [[]]
+        for keyword, kind, value in patterns:
+            if not keyword:
+                continue
+            node = 0
+            for ch in keyword:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    own.append([])
+                node = nxt
+            pattern_id = len(self.hits)
+            own[node].append(pattern_id)
+            self.hits.append(KeywordHit(kind, value, keyword))
+            self._priority.append((KIND_PRIORITY[kind], -len(keyword), pattern_id))
+
+        # 실패 링크 + 노드별 출력(실패 링크를 따라 끝나는 패턴 전부)을 BFS로 계산
+        self._fail = [0] * len(self._goto)
+        self._out = [tuple(ids) for ids in own]
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        # 노드별 최우선 패턴을 미리 골라 두면 best()는 훑으면서 비교만 하면 된다
+        self._best = [min(ids, key=self._priority.__getitem__) if ids else -1 for ids in self._out]
+
+    def __len__(self):
+        return len(self.hits)
+
+    def _walk(self, text):
+        """text를 한 글자씩 따라가며 방문한 노드 번호를 내보낸다"""
+        goto, fail = self._goto, self._fail
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            yield node
+
+    def find_all(self, text):
+        """text에 등장하는 모든 키워드 (등장 순서, 중복 제거 없음)"""
+        return [self.hits[i] for node in self._walk(text) for i in self._out[node]]
+
+    def best(self, text, kind=None):
+        """우선순위가 가장 높은 키워드 하나 (없으면 None), kind를 주면 그 종류 안에서만"""
+        best_id = -1
+        for node in self._walk(text):
+            if kind is None:
+                candidates = (self._best[node],)
+            else:
+                candidates = [i for i in self._out[node] if self.hits[i].kind == kind]
+            for candidate in candidates:
+                if candidate >= 0 and (best_id < 0 or self._priority[candidate] < self._priority[best_id]):
+                    best_id = candidate
+        return self.hits[best_id] if best_id >= 0 else None
+
+
+def build_keyword_matcher(faq_keywords, synonym_map):
+    """FAQ_KEYWORDS(번호별 키워드 목록)와 synonym_map(대표 키워드 → 동의어 목록)으로 매처 생성"""
+    patterns = []
+    for idx, keywords in enumerate(faq_keywords):
+        for kw in keywords:
+            patterns.append((kw, "faq", idx))
+    for rep_keyword, synonyms in synonym_map.items():
+        patterns.append((rep_keyword, "synonym", rep_keyword))
+        for syn in synonyms:
+            patterns.append((syn, "synonym", rep_keyword))
+    return KeywordMatcher(patterns)
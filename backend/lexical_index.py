@@ -0,0 +1,122 @@
+# lexical_index.py
+# 한국어 문자 바이그램 BM25 역색인 (하이브리드 검색의 어휘 검색 부분)
+#
+# 형태소 분석기 없이도 "시간외근무" ↔ "시간외 근무 신청" 처럼 띄어쓰기/조사가 달라도 겹치도록
+# 한글은 글자 2개씩(바이그램), 영문/숫자는 단어 단위로 자른다.
+# chatbot.py의 DuckDBEmbeddingRetriever가 임베딩 행렬과 같은 행 순서로 만들어 쓴다
+# (스냅샷을 쓰면 build_index.py가 미리 만들어 둔 배열을 메모리 맵으로 연다).
+import re
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from ann_index import top_k_indices
+
+
+_TOKEN_RE = re.compile(r"[가-힣]+|[a-z0-9]+")
+
+
+def tokenize(text):
+    """한글 연속 구간 → 글자 바이그램, 영문/숫자 → 단어"""
+    tokens = []
+    for word in _TOKEN_RE.findall((text or "").lower()):
+        if word[0] >= "가" and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """행 번호 기반 BM25 역색인 (postings는 단어별 CSR 배열)
+
+    terms   : 정렬된 단어 목록 (단어 id = 목록 안 위치) - list 또는 메모리 맵 스냅샷의 SnapshotTexts
+    rows / weights : 단어 id 순으로 이어 붙인 (행 번호, 가중치), 단어 i의 구간 = offsets[i]:offsets[i + 1]
+    BM25Index.build(contents)로 만든다. 배열은 그대로 스냅샷에 저장해 두고 메모리 맵으로 다시 열 수 있다
+    (vector_store.export_embedding_snapshot → 워커들이 한 벌을 공유).
+    """
+
+    def __init__(self, terms, rows, offsets, weights, idf, n_docs):
+        self.terms = terms
+        self.rows = rows
+        self.offsets = offsets
+        self.weights = weights
+        self.idf = idf
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, contents, k1=1.2, b=0.75):
+        n_docs = len(contents)
+        vocab = {}
+        term_ids, rows, tfs = [], [], []
+        doc_len = np.zeros(n_docs, dtype=np.float32)
+
+        for row, content in enumerate(contents):
+            counts = Counter(tokenize(content))
+            doc_len[row] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                rows.append(row)
+                tfs.append(tf)
+
+        # 단어 id를 정렬된 단어 순서로 다시 매긴다 (검색 때 이진 탐색으로 찾는다)
+        terms = sorted(vocab)
+        remap = np.empty(len(vocab), dtype=np.int64)
+        remap[[vocab[term] for term in terms]] = np.arange(len(terms))
+        term_ids = remap[np.asarray(term_ids, dtype=np.int64)]
+
+        order = np.argsort(term_ids, kind="stable")
+        rows = np.asarray(rows, dtype=np.int64)[order]
+        df = np.bincount(term_ids, minlength=len(terms))
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        # 문서 길이 정규화까지 끝낸 단어 가중치를 미리 계산 (검색 때는 idf만 곱한다)
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+        avgdl = float(doc_len.mean()) if n_docs and doc_len.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * doc_len[rows] / avgdl)
+        weights = (tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        return cls(terms, rows, offsets, weights, idf, n_docs)
+
+    def term_id(self, term):
+        """단어 → 단어 id (없으면 None)"""
+        i = bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def search(self, query, limit, rows=None):
+        """BM25 점수 상위 limit개 (행 번호, 점수) - 겹치는 단어가 없는 문서는 제외
+
+        rows: 이 행 번호들 안에서만 고른다 (메타 필터 결과)
+        """
+        term_ids = {self.term_id(t) for t in tokenize(query)} - {None}
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.rows[start:end]] += self.idf[term_id] * self.weights[start:end]
+
+        if rows is not None:
+            scores = scores[rows]
+        top = top_k_indices(scores, limit)
+        top = top[scores[top] > 0]
+        if rows is not None:
+            return rows[top], scores[top]
+        return top, scores[top]
+
+
+def reciprocal_rank_fusion(rankings, limit, k=60):
+    """여러 순위 목록(행 번호 배열)을 RRF로 합친다 → (행 번호, 점수) 내림차순"""
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank + 1)
+
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    top = top_k_indices(scores, limit)
+    return rows[top], scores[top]
@@ -0,0 +1,161 @@
+# metrics.py
+# 요청 단계별 소요 시간 측정 + Prometheus 텍스트 형식(/metrics) 내보내기
+#
+# prometheus_client 없이 필요한 만큼만 구현한다 (Histogram / 콜백 값 - 카운터도 이미 세고 있는 값을 콜백으로 읽는다).
+# 요청마다 RequestTrace를 하나 만들어 단계를 span()으로 감싸면,
+# finish() 때 단계별 시간이 hibot_stage_seconds, 전체 시간이 hibot_request_seconds 히스토그램에 들어간다.
+# uvicorn 워커가 여럿이면 값은 워커(프로세스)별이다.
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# 초 단위 (FAQ 응답 ~ms부터 Gemini 타임아웃 30초까지)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # 라벨 값 → [버킷별 개수, 합계, 개수]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, counts, total, count in sorted(items):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """내보낼 때마다 fn()을 불러 값을 읽는 지표 (캐시 통계처럼 다른 객체가 이미 세고 있는 값)
+
+    fn()은 {라벨 값 튜플: 값}을 반환한다 (라벨이 없으면 {(): 값}).
+    """
+
+    def __init__(self, name, help_text, fn, labelnames=(), metric_type="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.metric_type = metric_type
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            values = self.fn()
+        except Exception:
+            return lines
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus 텍스트 형식 (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "hibot_stage_seconds", "RAG 단계별 소요 시간(초)", ["stage"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "hibot_request_seconds", "요청 전체 소요 시간(초)", ["endpoint", "route"]
+))
+
+
+class RequestTrace:
+    """요청 하나의 단계별 소요 시간 기록
+
+    with trace.span("embed"): ... 처럼 감싸고, 응답이 끝나면 finish()를 한 번 부른다.
+    route: 요청이 어디서 끝났는지 (faq / rag / cache / busy / not_ready ...)
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.route = "rag"
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.finished = False
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - start
+
+    def finish(self, slow_threshold=None):
+        """히스토그램에 기록하고, slow_threshold(초)를 넘으면 단계별 시간을 로그로 남긴다"""
+        if self.finished:
+            return
+        self.finished = True
+        total = time.perf_counter() - self.started
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        REQUEST_SECONDS.observe(total, endpoint=self.endpoint, route=self.route)
+
+        if slow_threshold and total >= slow_threshold:
+            breakdown = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.stages.items())
+            print(f"🐢 느린 요청 {self.endpoint} ({self.route}) {total * 1000:.0f}ms: {breakdown or '단계 기록 없음'}")
+        return total
+
+
+def span(trace, stage):
+    """trace가 없을 때(ask_chatbot 등)도 같은 코드로 쓰기 위한 도우미"""
+    return trace.span(stage) if trace is not None else nullcontext()
@@ -0,0 +1,116 @@
+# reranker.py
+# 검색 후보를 크로스 인코더로 다시 채점하는 선택 단계
+#
+# 리트리버에서 후보를 넉넉히(candidates개) 받아 질문-문서 쌍을 한 배치로 채점하고,
+# threshold 미만은 버린 뒤 상위 top_k개만 남긴다 → 프롬프트가 짧아지고, 남는 게 없으면 Gemini 호출 생략.
+# 지연시간 상한:
+#   - 후보 수(candidates)와 문서 길이(max_chars)를 잘라서 넣는다
+#   - timeout 안에 끝나지 않으면 기다리지 않고 원래(벡터/하이브리드) 순서 상위 top_k개를 쓴다
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from haystack.dataclasses import Document
+
+
+class CrossEncoderReranker:
+    """SentenceTransformersSimilarityRanker(크로스 인코더) 래퍼 (스레드 안전)
+
+    model    : 예) "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1" (한국어 포함 다국어, CPU용 소형)
+    threshold: 시그모이드로 0~1에 맞춘 점수 기준 (None이면 자르지 않음)
+    timeout  : 채점 대기 시간(초) (None이면 끝날 때까지 기다림)
+    """
+
+    def __init__(self, model, top_k=4, candidates=20, threshold=None, timeout=1.5,
+                 max_chars=1000, batch_size=32, backend="torch"):
+        self.model = model
+        self.top_k = top_k
+        self.candidates = candidates
+        self.threshold = threshold
+        self.timeout = timeout
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self.backend = backend
+        self.ranker = None
+
+        # 모델 계산은 전용 스레드 하나에서 (timeout이 나도 호출한 쪽은 바로 돌아간다)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._lock = threading.Lock()
+        self.stats_counts = {"calls": 0, "timeouts": 0, "errors": 0, "no_relevant": 0}
+        self.seconds = 0.0
+
+    def warm_up(self):
+        # torch / sentence-transformers는 무거워서 쓸 때 import
+        from haystack.components.rankers import SentenceTransformersSimilarityRanker
+
+        self.ranker = SentenceTransformersSimilarityRanker(
+            model=self.model,
+            top_k=self.candidates,
+            scale_score=True,
+            batch_size=self.batch_size,
+            backend=self.backend,
+        )
+        self.ranker.warm_up()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats_counts[key] += 1
+
+    def _score(self, query, docs):
+        # 본문 앞부분만 채점 (크로스 인코더 비용은 입력 길이에 비례)
+        trimmed = [Document(id=doc.id, content=(doc.content or "")[:self.max_chars]) for doc in docs]
+        ranked = self.ranker.run(query=query, documents=trimmed)["documents"]
+        return {doc.id: doc.score for doc in ranked}
+
+    def run(self, query, documents):
+        """documents(검색 순위순)를 다시 채점 → {"documents": [...], "status": ...}
+
+        status: "reranked" | "no_relevant"(모두 threshold 미만) | "timeout" | "error"
+        timeout / error 이면 원래 순서 상위 top_k개를 그대로 돌려준다.
+        """
+        candidates = documents[:self.candidates]
+        if not candidates:
+            return {"documents": [], "status": "reranked"}
+
+        self._count("calls")
+        start = time.perf_counter()
+        future = self._executor.submit(self._score, query, candidates)
+        try:
+            scores = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._count("timeouts")
+            print(f"⏱️ 재순위 {self.timeout:.1f}s 초과 → 검색 순서 그대로 사용")
+            return {"documents": candidates[:self.top_k], "status": "timeout"}
+        except Exception as e:
+            self._count("errors")
+            print(f"⚠️ 재순위 실패 → 검색 순서 그대로 사용: {e}")
+            return {"documents": candidates[:self.top_k], "status": "error"}
+        finally:
+            with self._lock:
+                self.seconds += time.perf_counter() - start
+
+        reranked = []
+        for doc in candidates:
+            score = scores.get(doc.id)
+            if score is None or (self.threshold is not None and score < self.threshold):
+                continue
+            reranked.append(Document(id=doc.id, content=doc.content, meta=doc.meta, score=float(score)))
+        reranked.sort(key=lambda d: d.score, reverse=True)
+
+        if not reranked:
+            self._count("no_relevant")
+            return {"documents": [], "status": "no_relevant"}
+        return {"documents": reranked[:self.top_k], "status": "reranked"}
+
+    def stats(self):
+        with self._lock:
+            calls = self.stats_counts["calls"]
+            return dict(
+                self.stats_counts,
+                model=self.model,
+                avg_ms=round(self.seconds * 1000 / calls, 1) if calls else 0.0,
+            )
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
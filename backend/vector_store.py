@@ -0,0 +1,653 @@
+# vector_store.py
+# build_index.py(색인)와 chatbot.py(검색)가 함께 쓰는 documents 테이블 스키마/읽기 도우미
+#
+# 임베딩은 FLOAT[EMBEDDING_DIM] 고정 길이 배열로 저장한다.
+# (예전 DB의 DOUBLE[] 가변 리스트는 migrate_embedding_column()이 그대로 변환)
+# 자주 거르는 메타 값(파일 / 규정 이름 / 부서 / 시행일 …)은 meta JSON과 별도로 타입 있는 컬럼에도 저장한다.
+import datetime
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+from lexical_index import BM25Index
+
+
+EMBEDDING_DIM = 768  # jhgan/ko-sbert-nli 출력 차원
+
+# meta JSON에서 꺼내 두는 컬럼 (meta 원본은 그대로 유지)
+# doc_title: 규정 이름 (같은 규정의 개정판끼리 같은 값) / doc_hash: 원본 PDF 내용 해시
+META_COLUMNS = {
+    "file_name": "TEXT",
+    "doc_title": "TEXT",
+    "department": "TEXT",
+    "effective_date": "DATE",
+    "page_start": "INTEGER",
+    "page_end": "INTEGER",
+    "split_id": "INTEGER",
+    "doc_hash": "TEXT",
+}
+META_INDEXES = ("file_name", "doc_title", "department", "effective_date", "doc_hash")
+_ARROW_TYPES = {"TEXT": pa.string(), "DATE": pa.date32(), "INTEGER": pa.int32()}
+
+
+def normalize_rows(matrix):
+    """행별 L2 정규화 (0 벡터는 그대로 둔다)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+# ------------------------------
+# 스키마 / 마이그레이션
+# ------------------------------
+def setup_tables(conn, dim=EMBEDDING_DIM, normalize=False):
+    """documents / store_info 테이블 생성 + 예전 스키마 업그레이드"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            content TEXT,
+            meta TEXT,
+            embedding FLOAT[{dim}]
+        )
+    """)
+    # 저장소 설정값 (embedding_dim, normalized 등)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS store_info (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    migrate_embedding_column(conn, dim)
+    add_meta_columns(conn)
+
+    if normalize and not is_normalized(conn):
+        normalize_stored_embeddings(conn)
+    elif not read_store_info(conn).get("normalized"):
+        set_store_info(conn, "normalized", "false")
+    set_store_info(conn, "embedding_dim", str(dim))
+
+
+def embedding_column_type(conn):
+    row = conn.execute("""
+        SELECT data_type
+        FROM information_schema.columns
+        WHERE table_name = 'documents' AND column_name = 'embedding'
+    """).fetchone()
+    return row[0] if row else None
+
+
+def migrate_embedding_column(conn, dim=EMBEDDING_DIM):
+    """embedding 컬럼을 FLOAT[dim]으로 제자리 변환 (DOUBLE[] → FLOAT[768])
+
+    길이가 dim과 다른 벡터는 쓸 수 없으므로 NULL로 바꾸고 개수를 알려준다.
+    """
+    current = embedding_column_type(conn)
+    target = f"FLOAT[{dim}]"
+    if current is None or current == target:
+        return
+
+    print(f"🔧 embedding 컬럼 마이그레이션: {current} → {target}")
+    bad_rows = conn.execute(f"""
+        SELECT COUNT(*) FROM documents
+        WHERE embedding IS NOT NULL AND len(embedding) <> {dim}
+    """).fetchone()[0]
+
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(f"""
+            ALTER TABLE documents ALTER embedding TYPE {target}
+            USING (CASE WHEN len(embedding) = {dim} THEN embedding END)::{target}
+        """)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("CHECKPOINT")
+
+    if bad_rows:
+        print(f"⚠️ 차원이 {dim}이 아닌 임베딩 {bad_rows}개를 NULL로 변경했습니다 (--force 재색인 필요)")
+    print("✅ embedding 컬럼 마이그레이션 완료")
+
+
+def add_meta_columns(conn):
+    """META_COLUMNS 컬럼 추가 + 예전 행은 meta JSON에서 채우고, 필터용 인덱스 생성
+
+    인덱스가 걸린 테이블은 ALTER가 막히므로 컬럼 변경(임베딩 마이그레이션 포함)을 먼저 끝낸다.
+    """
+    existing = {row[0] for row in conn.execute("""
+        SELECT column_name FROM information_schema.columns WHERE table_name = 'documents'
+    """).fetchall()}
+    missing = [name for name in META_COLUMNS if name not in existing]
+    if missing:
+        print(f"🔧 메타 컬럼 추가: {', '.join(missing)}")
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            for name in missing:
+                conn.execute(f"ALTER TABLE documents ADD COLUMN {name} {META_COLUMNS[name]}")
+            backfill_meta_columns(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    for name in META_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{name} ON documents ({name})")
+
+
+def backfill_meta_columns(conn):
+    """meta JSON → 메타 컬럼 (meta_column_values와 같은 규칙으로 채움)"""
+    table = conn.execute("SELECT id, meta FROM documents WHERE meta IS NOT NULL").fetch_arrow_table()
+    metas = []
+    for meta_str in table.column("meta").to_pylist():
+        try:
+            metas.append(json.loads(meta_str) if meta_str else {})
+        except Exception:
+            metas.append({})
+    staged = pa.table({"id": table.column("id"), **meta_columns_arrays(metas)})
+    conn.register("staged_meta", staged)
+    try:
+        assignments = ", ".join(f"{name} = staged_meta.{name}" for name in META_COLUMNS)
+        conn.execute(f"UPDATE documents SET {assignments} FROM staged_meta WHERE documents.id = staged_meta.id")
+    finally:
+        conn.unregister("staged_meta")
+
+
+def parse_date(value):
+    """"2024-03-01" / "2024.03.01" / "20240301" / date → datetime.date (알 수 없으면 None)"""
+    if value is None or isinstance(value, datetime.date):
+        return value
+    match = re.fullmatch(r"\s*(\d{4})[-./]?(\d{1,2})[-./]?(\d{1,2})\.?\s*", str(value))
+    if not match:
+        return None
+    try:
+        return datetime.date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+def meta_column_values(meta):
+    """meta dict → META_COLUMNS 값 dict (페이지 범위가 없는 예전 청크는 page_number로 채움)"""
+    meta = meta or {}
+    values = {name: meta.get(name) for name in META_COLUMNS}
+    if values["page_start"] is None:
+        values["page_start"] = meta.get("page_number")
+    if values["page_end"] is None:
+        values["page_end"] = values["page_start"]
+    values["effective_date"] = parse_date(values["effective_date"])
+    return values
+
+
+def meta_columns_arrays(metas):
+    """meta 목록 → {컬럼 이름: Arrow 배열} (INSERT / 메모리 필터 테이블용)"""
+    rows = [meta_column_values(meta) for meta in metas]
+    arrays = {}
+    for name, sql_type in META_COLUMNS.items():
+        values = [row[name] for row in rows]
+        if sql_type == "INTEGER":
+            values = [int(v) if isinstance(v, (int, float)) else None for v in values]
+        elif sql_type == "TEXT":
+            values = [str(v) if v is not None else None for v in values]
+        arrays[name] = pa.array(values, type=_ARROW_TYPES[sql_type])
+    return arrays
+
+
+def normalize_stored_embeddings(conn):
+    """저장된 임베딩을 모두 단위 벡터로 바꾸고 normalized 플래그를 켠다"""
+    dim = int(embedding_column_type(conn)[len("FLOAT["):-1])
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(f"""
+            UPDATE documents
+            SET embedding = list_transform(
+                embedding::FLOAT[],
+                x -> x / sqrt(array_inner_product(embedding, embedding))
+            )::FLOAT[{dim}]
+            WHERE embedding IS NOT NULL
+              AND array_inner_product(embedding, embedding) > 0
+        """)
+        set_store_info(conn, "normalized", "true")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    print("✅ 저장된 임베딩을 정규화했습니다.")
+
+
+def read_store_info(conn):
+    """store_info 테이블 → dict (예전 DB라 테이블이 없으면 빈 dict)"""
+    try:
+        return dict(conn.execute("SELECT key, value FROM store_info").fetchall())
+    except Exception:
+        return {}
+
+
+def set_store_info(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)", (key, value))
+
+
+def is_normalized(conn):
+    return read_store_info(conn).get("normalized") == "true"
+
+
+# ------------------------------
+# 읽기 (Arrow → NumPy, 행마다 Python 객체를 만들지 않음)
+# ------------------------------
+def arrow_embeddings_to_matrix(column):
+    """Arrow의 FixedSizeList/List 임베딩 컬럼 → (N, dim) float32 행렬"""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if len(column) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if isinstance(column, pa.FixedSizeListArray):
+        dim = column.type.list_size
+    else:
+        # 예전 DOUBLE[] 스키마 (마이그레이션 전 DB를 읽기 전용으로 열었을 때)
+        lengths = np.diff(column.offsets.to_numpy())
+        dim = int(lengths[0])
+        if not np.all(lengths == dim):
+            raise ValueError("임베딩 차원이 일정하지 않습니다. build_index.py --force 로 재색인하세요.")
+
+    values = column.flatten().to_numpy(zero_copy_only=False)
+    return values.astype(np.float32, copy=False).reshape(-1, dim)
+
+
+def load_embedding_matrix(conn, with_meta=True):
+    """documents 테이블의 임베딩을 정규화된 float32 행렬로 읽는다
+
+    반환: (ids, metas, matrix) - 세 값은 id 순으로 같은 행 순서를 공유한다.
+    with_meta=False이면 metas는 None.
+    store_info.normalized가 true이면 저장된 벡터를 그대로 사용한다.
+    """
+    columns = "id, meta, embedding" if with_meta else "id, embedding"
+    table = conn.execute(f"""
+        SELECT {columns}
+        FROM documents
+        WHERE embedding IS NOT NULL
+        ORDER BY id
+    """).fetch_arrow_table()
+
+    ids = np.asarray(table.column("id").to_numpy(zero_copy_only=False), dtype=object)
+    matrix = arrow_embeddings_to_matrix(table.column("embedding"))
+
+    if matrix.shape[0] and not is_normalized(conn):
+        if not matrix.flags.writeable:
+            matrix = matrix.copy()
+        matrix = normalize_rows(matrix)
+
+    metas = None
+    if with_meta:
+        metas = []
+        for meta_str in table.column("meta").to_pylist():
+            try:
+                metas.append(json.loads(meta_str) if meta_str else {})
+            except Exception:
+                metas.append({})
+
+    return ids, metas, np.ascontiguousarray(matrix)
+
+
+def load_document_texts(conn):
+    """load_embedding_matrix와 같은 행 순서의 본문 목록 (어휘 색인 생성용)"""
+    table = conn.execute("""
+        SELECT content
+        FROM documents
+        WHERE embedding IS NOT NULL
+        ORDER BY id
+    """).fetch_arrow_table()
+    return table.column("content").to_pylist()
+
+
+# ------------------------------
+# 메타 필터 (Haystack 2 필터 문법 → DuckDB WHERE 절)
+# ------------------------------
+# {"field": "meta.doc_title", "operator": "==", "value": "보수규정"}
+# {"operator": "AND", "conditions": [{...}, {"field": "meta.is_current", "operator": "==", "value": True}]}
+# meta.is_current: 같은 규정(doc_title, 없으면 file_name) 중 오늘 기준 가장 최근에 시행된 개정판인지
+#                  (시행일이 없는 문서는 항상 현행으로 본다)
+FILTER_OPERATORS = {"==": "=", "!=": "<>", ">": ">", ">=": ">=", "<": "<", "<=": "<="}
+CURRENT_REVISION_SQL = """
+    effective_date IS NULL OR effective_date = max(effective_date)
+        FILTER (WHERE effective_date <= current_date)
+        OVER (PARTITION BY coalesce(doc_title, file_name))
+"""
+_JSON_KEY_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _filter_field(field, meta_json):
+    """필드 이름 → (SQL 식, 타입)
+
+    meta_json=False: 메타 컬럼만 있는 테이블 (리트리버의 메모리 필터) → 그 밖의 필드는 ValueError
+    """
+    if not isinstance(field, str):
+        raise ValueError(f"필터 필드가 없습니다: {field!r}")
+    name = field[len("meta."):] if field.startswith("meta.") else field
+    if name in META_COLUMNS:
+        return name, META_COLUMNS[name]
+    if name == "is_current":
+        return "is_current", "BOOLEAN"
+    if field == "id":
+        return "id", "TEXT"
+    if meta_json:
+        if field == "content":
+            return "content", "TEXT"
+        if field.startswith("meta.") and _JSON_KEY_RE.fullmatch(name):
+            return f"json_extract_string(meta, '$.{name}')", "TEXT"
+    raise ValueError(f"필터에 쓸 수 없는 필드입니다: {field}")
+
+
+def _filter_param(value, sql_type):
+    if sql_type == "DATE":
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"날짜 형식이 아닙니다: {value!r}")
+        return date
+    if sql_type == "TEXT":
+        return str(value)
+    return value
+
+
+def _filter_clause(condition, params, used, meta_json):
+    if not isinstance(condition, dict):
+        raise ValueError(f"필터 조건은 dict여야 합니다: {condition!r}")
+    operator = condition.get("operator")
+
+    if "conditions" in condition:
+        conditions = condition["conditions"]
+        if operator not in ("AND", "OR", "NOT") or not isinstance(conditions, list) or not conditions:
+            raise ValueError(f"잘못된 논리 필터입니다: {condition!r}")
+        parts = [_filter_clause(c, params, used, meta_json) for c in conditions]
+        if operator == "NOT":
+            return "NOT (" + " AND ".join(parts) + ")"
+        return "(" + f" {operator} ".join(parts) + ")"
+
+    column, sql_type = _filter_field(condition.get("field"), meta_json)
+    used.add(column)
+    value = condition.get("value")
+
+    if operator in ("in", "not in"):
+        if not isinstance(value, list):
+            raise ValueError(f"'{operator}' 필터 값은 리스트여야 합니다: {value!r}")
+        if not value:
+            return "FALSE" if operator == "in" else "TRUE"
+        params.extend(_filter_param(v, sql_type) for v in value)
+        placeholders = ", ".join("?" for _ in value)
+        if operator == "in":
+            return f"{column} IN ({placeholders})"
+        # 값이 없는(NULL) 문서도 "not in"에는 포함 (Haystack 필터와 같은 의미)
+        return f"coalesce({column} NOT IN ({placeholders}), TRUE)"
+
+    if operator not in FILTER_OPERATORS:
+        raise ValueError(f"지원하지 않는 필터 연산자입니다: {operator!r}")
+    if value is None:
+        if operator == "==":
+            return f"{column} IS NULL"
+        if operator == "!=":
+            return f"{column} IS NOT NULL"
+        raise ValueError(f"'{operator}' 필터는 None과 비교할 수 없습니다")
+
+    params.append(_filter_param(value, sql_type))
+    if operator == "!=":
+        return f"{column} IS DISTINCT FROM ?"
+    return f"{column} {FILTER_OPERATORS[operator]} ?"
+
+
+def filters_to_sql(filters, meta_json=True, used=None):
+    """Haystack 2 필터 dict → (WHERE 절, 파라미터 목록) - 잘못된 필터는 ValueError
+
+    used: set을 주면 조건에 쓰인 컬럼 이름을 모아준다
+    """
+    params = []
+    sql = _filter_clause(filters, params, set() if used is None else used, meta_json)
+    return sql, params
+
+
+def filtered_select(table, columns, filters, meta_json=True):
+    """table에서 filters를 만족하는 행의 columns를 고르는 SELECT 문 → (sql, params)
+
+    is_current를 거를 때만 개정판 판단(윈도 함수)을 붙인다.
+    나머지 조건은 그대로 WHERE에 들어가 DuckDB 스캔 단계에서 걸러진다.
+    """
+    if not filters:
+        return f"SELECT {columns} FROM {table}", []
+    used = set()
+    where, params = filters_to_sql(filters, meta_json, used)
+    if "is_current" in used:
+        table = f"""(
+            SELECT * FROM {table}
+            JOIN (SELECT id, ({CURRENT_REVISION_SQL}) AS is_current FROM {table}) USING (id)
+        )"""
+    return f"SELECT {columns} FROM {table} WHERE {where}", params
+
+
+def meta_filter_table(ids, metas):
+    """리트리버 행 순서의 필터용 Arrow 테이블 (row, id, 메타 컬럼)"""
+    return pa.table({"row": np.arange(len(ids), dtype=np.int64), "id": pa.array(list(ids), type=pa.string()),
+                     **meta_columns_arrays(metas)})
+
+
+class MetaFilter:
+    """리트리버 행 순서의 메타 컬럼(Arrow 테이블)에 DuckDB로 필터 → 행 번호를 구한다
+
+    table은 meta_filter_table()로 만들거나 스냅샷의 메모리 맵 Arrow 파일을 그대로 쓴다 (복사하지 않고 조회).
+    벡터 점수는 여기서 고른 행에 대해서만 계산한다.
+    같은 필터는 날짜가 바뀌기 전까지 결과를 재사용한다 (is_current가 날짜에 따라 달라지므로).
+    여러 스레드에서 동시에 rows()를 호출해도 된다.
+    """
+
+    def __init__(self, table, cache_size=128):
+        self.table = table
+        self.conn = duckdb.connect()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rows(self, filters):
+        """filters를 만족하는 행 번호 (오름차순 int64 배열)"""
+        key = (json.dumps(filters, sort_keys=True, ensure_ascii=False, default=str), datetime.date.today())
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        sql, params = filtered_select("documents", "row", filters, meta_json=False)
+        # 등록한 Arrow 테이블은 그 연결에서만 보이므로 커서마다 등록 (복사 없음)
+        cursor = self.conn.cursor()
+        try:
+            cursor.register("documents", self.table)
+            rows = cursor.execute(sql + " ORDER BY row", params).fetchnumpy()["row"]
+        finally:
+            cursor.close()
+        rows = np.asarray(rows, dtype=np.int64)
+
+        with self._lock:
+            self._cache[key] = rows
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+
+# ------------------------------
+# 메모리 맵 스냅샷 (여러 워커가 한 벌의 임베딩/본문을 공유)
+# ------------------------------
+# hibot_store.vectors/
+#   CURRENT                 ← 지금 쓸 버전 디렉터리 이름 (os.replace로 원자적 교체)
+#   v1735700000123456789/    ← 버전 = 내보낸 시각(ns)
+#     embeddings.npy        ← 정규화된 float32 (N, dim) 행렬
+#     contents.npy          ← 본문 UTF-8 바이트를 행 순서대로 이어 붙인 uint8 배열
+#     offsets.npy           ← 행 i의 본문 = contents[offsets[i]:offsets[i + 1]]
+#     metas.npy / meta_offsets.npy   ← 행별 meta JSON (같은 방식, 검색 결과 행만 파싱)
+#     meta_columns.arrow    ← 필터용 타입 메타 컬럼 (row, id, META_COLUMNS) Arrow IPC 파일
+#     bm25_*.npy            ← BM25 색인 (정렬된 단어 / postings 행·가중치·구간 / idf)
+#     rows.json             ← 형식 버전 + 행 순서의 ids + 문서 수
+# .npy / .arrow는 워커가 메모리 맵으로 열기 때문에 여러 프로세스가 같은 페이지 캐시를 쓴다.
+# (워커마다 따로 갖는 것은 ids 목록과 질문마다 만드는 점수 배열 정도)
+# 버전 디렉터리는 한 번 쓰면 고치지 않으므로, 워커가 옛 버전을 매핑한 채로 있어도 안전하다.
+SNAPSHOT_SUFFIX = ".vectors"
+SNAPSHOT_POINTER = "CURRENT"
+# 스냅샷 파일 구성이 바뀌면 올린다 (예전 형식은 읽지 않고 build_index.py가 다시 내보낸다)
+SNAPSHOT_FORMAT = 2
+
+
+def embedding_snapshot_dir(db_path):
+    """hibot_store.db → hibot_store.vectors/"""
+    base, _ = os.path.splitext(db_path)
+    return base + SNAPSHOT_SUFFIX
+
+
+def embedding_snapshot_pointer(db_path):
+    return os.path.join(embedding_snapshot_dir(db_path), SNAPSHOT_POINTER)
+
+
+# load_embedding_snapshot 반환값 (lexical_index: BM25Index, meta_table: MetaFilter용 Arrow 테이블)
+EmbeddingSnapshot = namedtuple(
+    "EmbeddingSnapshot", ["version", "ids", "metas", "matrix", "texts", "lexical_index", "meta_table"]
+)
+
+
+class SnapshotTexts:
+    """메모리 맵 본문 블롭을 행 번호로 꺼내 쓰는 읽기 전용 목록"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+
+class SnapshotMetas(SnapshotTexts):
+    """메모리 맵 meta JSON 블롭 → 행 번호로 꺼낼 때마다 dict로 파싱"""
+
+    def __getitem__(self, row):
+        text = super().__getitem__(row)
+        return json.loads(text) if text else {}
+
+
+def _encode_strings(strings):
+    """문자열 목록 → (UTF-8 바이트를 이어 붙인 uint8 배열, int64 구간 배열) - SnapshotTexts 형식"""
+    encoded = [(text or "").encode("utf-8") for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def export_embedding_snapshot(conn, db_path, keep=2):
+    """documents 테이블의 임베딩/본문/메타/BM25 색인을 새 버전 디렉터리로 내보내고 CURRENT를 바꾼다
+
+    keep: 남겨둘 최근 버전 수 (교체 직후에도 이전 버전을 읽는 워커가 있을 수 있다)
+    반환: 새 버전 디렉터리 경로
+    """
+    ids, metas, matrix = load_embedding_matrix(conn)
+    texts = load_document_texts(conn)
+    blob, offsets = _encode_strings(texts)
+    meta_blob, meta_offsets = _encode_strings(json.dumps(meta, ensure_ascii=False) for meta in metas)
+    lexical_index = BM25Index.build(texts)
+    term_blob, term_offsets = _encode_strings(lexical_index.terms)
+
+    root = embedding_snapshot_dir(db_path)
+    os.makedirs(root, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    tmp_dir = os.path.join(root, "." + version)
+    os.makedirs(tmp_dir)
+    arrays = {
+        "embeddings": matrix.astype(np.float32, copy=False),
+        "contents": blob,
+        "offsets": offsets,
+        "metas": meta_blob,
+        "meta_offsets": meta_offsets,
+        "bm25_terms": term_blob,
+        "bm25_term_offsets": term_offsets,
+        "bm25_rows": lexical_index.rows,
+        "bm25_offsets": lexical_index.offsets,
+        "bm25_weights": lexical_index.weights,
+        "bm25_idf": lexical_index.idf,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    table = meta_filter_table(ids, metas)
+    with pa.OSFile(os.path.join(tmp_dir, "meta_columns.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    with open(os.path.join(tmp_dir, "rows.json"), "w", encoding="utf-8") as f:
+        json.dump({"format": SNAPSHOT_FORMAT, "count": len(ids), "ids": ids.tolist()}, f, ensure_ascii=False)
+    os.replace(tmp_dir, os.path.join(root, version))
+
+    # 포인터 교체가 곧 배포 (워커는 CURRENT의 수정시각이 바뀌면 새 버전을 매핑한다)
+    pointer = embedding_snapshot_pointer(db_path)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    versions = sorted(name for name in os.listdir(root) if name.startswith("v"))
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    size_mb = sum(array.nbytes for array in arrays.values()) / 1024 / 1024
+    print(f"🗺️ 임베딩 스냅샷 내보내기: {len(ids)}개 문서, {size_mb:.1f}MB → {os.path.join(root, version)}")
+    return os.path.join(root, version)
+
+
+def load_embedding_snapshot(db_path):
+    """CURRENT가 가리키는 스냅샷을 읽기 전용 메모리 맵으로 연다
+
+    반환: EmbeddingSnapshot - 스냅샷이 없으면 None (예전 형식이면 ValueError)
+    ids / matrix 는 load_embedding_matrix와 같은 형태, metas / texts는 행 번호로 꺼내는 목록.
+    """
+    try:
+        with open(embedding_snapshot_pointer(db_path), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    snapshot_dir = os.path.join(embedding_snapshot_dir(db_path), version)
+    with open(os.path.join(snapshot_dir, "rows.json"), "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    if rows.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"예전 형식의 임베딩 스냅샷입니다 (build_index.py를 다시 실행하면 새로 내보냅니다): {snapshot_dir}")
+
+    def load(name):
+        return np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode="r")
+
+    matrix = load("embeddings")
+    texts = SnapshotTexts(load("contents"), load("offsets"))
+    metas = SnapshotMetas(load("metas"), load("meta_offsets"))
+    terms = SnapshotTexts(load("bm25_terms"), load("bm25_term_offsets"))
+    count = rows["count"]
+    lexical_index = BM25Index(
+        terms, load("bm25_rows"), load("bm25_offsets"), load("bm25_weights"), load("bm25_idf"), count
+    )
+    meta_table = pa.ipc.open_file(pa.memory_map(os.path.join(snapshot_dir, "meta_columns.arrow"))).read_all()
+    if (len(rows["ids"]) != count or len(texts) != count or len(metas) != count
+            or meta_table.num_rows != count or (count and matrix.shape[0] != count)):
+        raise ValueError(f"임베딩 스냅샷 행 수가 맞지 않습니다: {snapshot_dir}")
+
+    ids = np.asarray(rows["ids"], dtype=object)
+    return EmbeddingSnapshot(version, ids, metas, matrix, texts, lexical_index, meta_table)
+
+
+def embedding_snapshot_current(db_path):
+    """CURRENT가 있고 지금 형식의 스냅샷을 가리키는지 (아니면 build_index.py가 다시 내보낸다)"""
+    try:
+        with open(embedding_snapshot_pointer(db_path), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        with open(os.path.join(embedding_snapshot_dir(db_path), version, "rows.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("format") == SNAPSHOT_FORMAT
+    except (OSError, ValueError):
+        return False
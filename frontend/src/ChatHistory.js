@@ -4,7 +4,9 @@ function ChatHistory({ chatHistory }) {
   const scrollRef = useRef(null);
 
   useEffect(() => {
-    scrollRef.current?.scrollIntoView({ behavior: "smooth" });
+    // 답변이 스트리밍되는 동안에는 토큰마다 부드럽게 스크롤하면 밀리므로 바로 이동
+    const streaming = chatHistory[chatHistory.length - 1]?.isStreaming;
+    scrollRef.current?.scrollIntoView({ behavior: streaming ? "auto" : "smooth" });
   }, [chatHistory]);
 
   return (
@@ -18,7 +20,7 @@ function ChatHistory({ chatHistory }) {
           <div
             className={`max-w-[70%] px-4 py-3 rounded-xl opacity-0 
             animate-[fadeInUp_0.5s_ease-out_forwards]
-            text-sm sm:text-[16px]
+            text-sm sm:text-[16px] whitespace-pre-wrap
             ${msg.sender === "user"
               ? "bg-blue-500 text-white self-end"
               : "bg-gray-300 text-gray-900 self-start"
@@ -31,7 +33,12 @@ function ChatHistory({ chatHistory }) {
                 <span className="w-2 h-2 bg-gray-500 rounded-full animate-bounce [animation-duration:0.6s]" />
               </div>
             ) : (
-              msg.text
+              <>
+                {msg.text}
+                {msg.isStreaming && (
+                  <span className="inline-block w-2 h-4 ml-0.5 align-middle bg-gray-500 animate-pulse" />
+                )}
+              </>
             )}
           </div>
         </div>
@@ -1,5 +1,34 @@
 import { useState } from "react";
 
+const API_URL = 'https://hibot-chat-production.up.railway.app';
+
+// SSE 응답 본문을 읽으면서 "event: ...\ndata: {...}" 프레임마다 onEvent(event, data) 호출
+async function readEventStream(body, onEvent) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 function Input({ setChatHistory, isLoading, setIsLoading }) {
     const [currentMessage, setCurrentMessage] = useState('');
     const notAllowed = isLoading || !currentMessage;
@@ -24,8 +53,8 @@ function Input({ setChatHistory, isLoading, setIsLoading }) {
             { sender: 'bot', text: "", isLoading: true }
         ]);
         try {
-            // 3. 백엔드 API에 사용자 메시지 전송 (POST)
-            const response = await fetch('https://hibot-chat-production.up.railway.app/api/chat', {
+            // 3. 백엔드 스트리밍 API에 사용자 메시지 전송 (POST, Server-Sent Events 응답)
+            const response = await fetch(`${API_URL}/api/chat/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -33,27 +62,38 @@ function Input({ setChatHistory, isLoading, setIsLoading }) {
                 body: JSON.stringify({ message: userMessage }), // JSON 형태로 전송
             });
 
-            const data = await response.json();
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP ${response.status}`);
+            }
 
-            // 4. 백엔드에서 받은 봇의 응답을 대화 내역에 추가
-            setChatHistory(prevHistory => {
-                const newHistory = [...prevHistory];
-                newHistory[newHistory.length - 1] = { sender: 'bot', text: data.response };
-                return newHistory;
+            // 4. 답변 조각이 도착할 때마다 마지막 봇 메시지에 이어 붙이기
+            await readEventStream(response.body, (event, data) => {
+                if (event === 'token') {
+                    updateLastBotMessage(msg => ({ ...msg, text: msg.text + data.text, isLoading: false, isStreaming: true }));
+                } else if (event === 'source') {
+                    updateLastBotMessage(msg => ({ ...msg, text: `${msg.text}\n\n📄 출처: ${data.text}` }));
+                }
             });
+
+            updateLastBotMessage(msg => ({ sender: 'bot', text: msg.text }));
             setIsLoading(false);
         } catch (error) {
             console.error('챗봇 응답 오류:', error);
             // 5. 오류 발생 시
-            setChatHistory(prevHistory => {
-                const newHistory = [...prevHistory];
-                newHistory[newHistory.length - 1] = { sender: 'bot', text: '오류가 발생했습니다. 서버를 확인해주세요.' };
-                return newHistory;
-            });
+            updateLastBotMessage(() => ({ sender: 'bot', text: '오류가 발생했습니다. 서버를 확인해주세요.' }));
             setIsLoading(false);
         }
     };
 
+    // 대화 내역의 마지막(응답 중인) 봇 메시지 갱신
+    const updateLastBotMessage = (update) => {
+        setChatHistory(prevHistory => {
+            const newHistory = [...prevHistory];
+            newHistory[newHistory.length - 1] = update(newHistory[newHistory.length - 1]);
+            return newHistory;
+        });
+    };
+
     return (
         <form onSubmit={handleSubmit} className="w-full">
             <div class="relative">